@@ -19,6 +19,7 @@ Build everything for keymon.
 
 * Build the man pages.
 * Create the screen shots.
+* Pre-render the theme sprite atlases.
 * Build the debian package.
 * Build the zip file via setup.py sdist
 
@@ -67,6 +68,11 @@ def build_screen_shots():
     pybdist.clean_config(setup)
 #end build_screen_shots
 
+def build_atlases():
+    """Pre-render the sprite atlases of the built-in themes."""
+    subprocess.check_call(['python3', '-m', 'keymon.atlas'], cwd='src')
+#end build_atlases
+
 def main():
     """Run the program, put here to make linter happy."""
     parser = optparse.OptionParser()
@@ -77,10 +83,19 @@ def main():
         action='store_true',
         help='Only build png files'
       )
+    parser.add_option \
+      (
+        '--atlas',
+        dest='atlas',
+        action='store_true',
+        help='Only build the theme sprite atlases'
+      )
     pybdist.add_standard_options(parser, setup)
     options, unused_args = parser.parse_args()
     if options.png:
         build_screen_shots()
+    elif options.atlas:
+        build_atlases()
     elif not pybdist.handle_standard_options(options, setup):
         print('Doing nothing.  --help for commands.')
     #end if
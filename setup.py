@@ -54,7 +54,7 @@ SETUP = dict \
         {
             'keymon':
                 [
-                    'themes/**/*', '*.kbd',
+                    'themes/**/*', '*.kbd', 'keysyms.dat',
                     'icons/key-mon.desktop',
                     'locale/**/*/*.mo',
                 ],
@@ -68,7 +68,7 @@ SETUP = dict \
             ),
             ('share/icons/hicolor', ['icons/hicolor/scalable/apps/%s.svg' % NAME]),
         ],
-    scripts=['src/key-mon'],
+    scripts=['src/key-mon', 'src/key-mon-compile-theme'],
     author=AUTHOR_NAME,
     author_email='scott+keymon@forusers.com',
     platforms=['POSIX'],
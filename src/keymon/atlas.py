@@ -0,0 +1,166 @@
+#!/usr/bin/python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Pre-render the images of a theme into sprite atlases.
+
+For each of the standard scales, every named image from names_to_fnames()
+plus the keys of the US keyboard are rendered and packed into one PNG
+file.  An index file next to it gives the position of each image by the
+signature of its operations (see lazy_pixbuf_creator.ops_signature), and
+the hash of every file they are drawn from: the atlas is not used once
+one of them was edited.
+
+At run time LazyPixbufCreator hands out sub-surfaces of the atlas, which
+share its pixels, instead of rendering any SVG.  On HiDPI monitors the
+atlas for the scale times the device scale factor is used.
+
+Usage: python3 -m keymon.atlas [theme-dir ...]
+"""
+
+__author__ = 'Scott Kirkwood (scott+keymon@forusers.com)'
+
+import os
+import sys
+import cairo
+
+from keymon import key_mon
+from keymon import key_table
+from keymon import lazy_pixbuf_creator
+from keymon import mod_mapper
+
+SCALES = (0.75, 1.0, 1.25, 2.0)
+ATLAS_WIDTH = 1024
+  # width of the atlas at scale 1.0
+
+def atlas_ops(theme_dir, scale):
+    """Return a dict of signature to image operations to put in the atlas."""
+    if scale < 1.0:
+        svg_size = '-small'
+    else:
+        svg_size = ''
+    #end if
+
+    def svg_name(fname):
+        return key_mon.svg_name(theme_dir, fname, svg_size)
+    #end svg_name
+
+#begin atlas_ops
+    all_ops = []
+    for swap_buttons in (False, True):
+        all_ops.extend(key_mon.names_to_fnames(svg_name, scale, swap_buttons).values())
+    #end for
+    modmap = mod_mapper.read_kdb('us.kbd')
+    for info in key_table.KeyTable(modmap, scale, ()).infos():
+        if info.template:
+            all_ops.append([lazy_pixbuf_creator.KeyLabel(svg_name(info.template), info.label)])
+        #end if
+    #end for
+    ret = {}
+    for ops in all_ops:
+        signature = lazy_pixbuf_creator.ops_signature(ops, theme_dir)
+        if signature:
+            ret[signature] = ops
+        #end if
+    #end for
+    return ret
+#end atlas_ops
+
+def pack(sizes, max_width):
+    """Simple shelf packing.
+    Args:
+      sizes: dict of key to (width, height).
+      max_width: the width of the atlas.
+    Returns:
+      (positions, width, height) where positions is a dict of key to (x, y).
+    """
+    positions = {}
+    x = y = shelf_height = width = 0
+    for key in sorted(sizes, key = lambda k: (- sizes[k][1], k)):
+        w, h = sizes[key]
+        if x and x + w > max_width:
+            y += shelf_height
+            x = shelf_height = 0
+        #end if
+        positions[key] = (x, y)
+        x += w
+        width = max(width, x)
+        shelf_height = max(shelf_height, h)
+    #end for
+    return positions, width, y + shelf_height
+#end pack
+
+def build_atlas(theme_dir, scale, dest_dir=None):
+    """Render and write the atlas and its index for one theme and scale.
+    Args:
+      theme_dir: directory of the theme.
+      scale: scale to render at.
+      dest_dir: where to write the atlas, defaults to theme_dir.
+    Returns:
+      The filename of the atlas image.
+    """
+    name_fnames = atlas_ops(theme_dir, scale)
+    creator = lazy_pixbuf_creator.LazyPixbufCreator(name_fnames, scale)
+    images = dict((sig, creator.get(sig)) for sig in name_fnames)
+    positions, width, height = pack \
+      (
+        dict((sig, (img.get_width(), img.get_height())) for sig, img in images.items()),
+        round(ATLAS_WIDTH * scale)
+      )
+    pix = cairo.ImageSurface(cairo.Format.ARGB32, width, height)
+    gc = cairo.Context(pix)
+    for sig, (x, y) in positions.items():
+        gc.set_source_surface(images[sig], x, y)
+        gc.paint()
+    #end for
+    gc = None
+    fname = lazy_pixbuf_creator.atlas_fname(dest_dir or theme_dir, scale)
+    pix.write_to_png(fname)
+    sources = set \
+      (
+        lazy_pixbuf_creator.op_fname(operation)
+        for ops in name_fnames.values()
+        for operation in ops
+      )
+    fout = open(fname + '.idx', 'w', encoding='utf-8')
+    for source in sorted(sources):
+        fout.write('# source %s %s\n' % (lazy_pixbuf_creator.source_digest(source), os.path.basename(source)))
+    #end for
+    for sig in sorted(positions):
+        x, y = positions[sig]
+        fout.write('%d %d %d %d %s\n' % (x, y, images[sig].get_width(), images[sig].get_height(), sig))
+    #end for
+    fout.close()
+    print('Output %r with %d images' % (fname, len(positions)))
+    return fname
+#end build_atlas
+
+def main():
+    """Build the atlases of the themes given, or of all built-in themes."""
+    theme_dirs = sys.argv[1:]
+    if not theme_dirs:
+        themes = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'themes')
+        theme_dirs = [os.path.join(themes, entry) for entry in sorted(os.listdir(themes))]
+    #end if
+    for theme_dir in theme_dirs:
+        for scale in SCALES:
+            build_atlas(os.path.abspath(theme_dir), scale)
+        #end for
+    #end for
+#end main
+
+if __name__ == '__main__':
+    main()
+#end if
@@ -0,0 +1,162 @@
+#!/usr/bin/python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Find the themes and kbd files without scanning for them every time.
+
+What a scan of the theme and config directories finds (the description
+of each theme, the file of each image of the directory themes and the
+kbd files) is kept in an index in the cache directory, with the mtime of
+every directory it listed.  The index is used as long as none of these
+directories changed.
+"""
+
+import logging
+import marshal
+import os
+from configparser import ConfigParser
+
+from keymon import theme_bundle
+
+INDEX_FILE = 'discovery.marshal'
+INDEX_VERSION = 1
+
+_indexes = {}
+  # index filename to the index read or written in this process
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    #end try
+#end _mtime
+
+def scan(theme_dirs, kbd_dirs):
+    """List the directories and return their index.
+    Args:
+      theme_dirs: directories holding themes, by precedence.
+      kbd_dirs: directories holding kbd files.
+    """
+    stamps = {}
+    themes = {}
+    files = {}
+    for theme_dir in theme_dirs:
+        stamps[theme_dir] = _mtime(theme_dir)
+        entries = sorted(os.listdir(theme_dir))
+        # compiled themes take precedence over directories of the same name
+        for entry in entries:
+            if entry.endswith(theme_bundle.BUNDLE_EXT):
+                name = entry[:-len(theme_bundle.BUNDLE_EXT)]
+                fname = os.path.join(theme_dir, entry)
+                try:
+                    desc = theme_bundle.ThemeBundle(fname).description
+                except Exception:
+                    logging.warning('Unable to read theme %r' % fname)
+                    continue
+                #end try
+                if name not in themes:
+                    themes[name] = (desc, fname)
+                #end if
+            #end if
+        #end for
+        for entry in entries:
+            if entry.endswith(theme_bundle.BUNDLE_EXT):
+                continue
+            path = os.path.join(theme_dir, entry)
+            theme_config = os.path.join(path, 'config')
+            try:
+                parser = ConfigParser()
+                parser.read(theme_config)
+                desc = parser.get('theme', 'description')
+                if entry not in themes:
+                    themes[entry] = (desc, path)
+                    stamps[path] = _mtime(path)
+                    files[path] = theme_bundle.theme_files(os.listdir(path))
+                #end if
+            except:
+                logging.warning('Unable to read theme %r' % theme_config)
+            #end try
+        #end for
+    #end for
+    kbd_files = []
+    for kbd_dir in kbd_dirs:
+        stamps[kbd_dir] = _mtime(kbd_dir)
+        kbd_files.extend \
+          (
+            os.path.join(kbd_dir, entry)
+            for entry in sorted(os.listdir(kbd_dir))
+            if entry.endswith('.kbd')
+          )
+    #end for
+    return \
+        {
+            'version' : INDEX_VERSION,
+            'theme_dirs' : list(theme_dirs),
+            'kbd_dirs' : list(kbd_dirs),
+            'stamps' : stamps,
+            'themes' : themes,
+            'theme_files' : files,
+            'kbd_files' : kbd_files,
+        }
+#end scan
+
+def _is_valid(index, theme_dirs, kbd_dirs):
+    return \
+        (
+            isinstance(index, dict)
+        and
+            index.get('version') == INDEX_VERSION
+        and
+            index['theme_dirs'] == list(theme_dirs)
+        and
+            index['kbd_dirs'] == list(kbd_dirs)
+        and
+            all(_mtime(path) == mtime for path, mtime in index['stamps'].items())
+        )
+#end _is_valid
+
+def get_index(theme_dirs, kbd_dirs, cache_dir, refresh=False):
+    """Return the index of the directories, from the cache in cache_dir if
+    it is still valid and refresh is False."""
+    fname = os.path.join(cache_dir, INDEX_FILE)
+    index = _indexes.get(fname)
+    if index is None and not refresh:
+        try:
+            fin = open(fname, 'rb')
+            index = marshal.load(fin)
+            fin.close()
+        except FileNotFoundError:
+            pass
+        except (OSError, EOFError, ValueError, TypeError) as err:
+            logging.warning('Ignoring discovery index %r: %s' % (fname, err))
+        #end try
+    #end if
+    if refresh or not _is_valid(index, theme_dirs, kbd_dirs):
+        logging.debug('Scanning for themes and kbd files')
+        index = scan(theme_dirs, kbd_dirs)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            fout = open(fname + '.tmp', 'wb')
+            marshal.dump(index, fout)
+            fout.close()
+            os.replace(fname + '.tmp', fname)
+        except OSError as err:
+            logging.warning('Unable to write discovery index %r: %s' % (fname, err))
+        #end try
+    #end if
+    _indexes[fname] = index
+    return index
+#end get_index
@@ -0,0 +1,100 @@
+#!/usr/bin/python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+import unittest
+import discovery
+
+class TestDiscovery(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.themes = os.path.join(self.tmpdir, 'themes')
+        self.kbds = os.path.join(self.tmpdir, 'kbds')
+        self.cache_dir = os.path.join(self.tmpdir, 'cache')
+        os.makedirs(self.kbds)
+        self.add_theme('plain', ('alt.svg', 'alt-small.svg', 'ctrl.svg'))
+        self.write(os.path.join(self.kbds, 'us.kbd'))
+        discovery._indexes.clear()
+    #end setUp
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        discovery._indexes.clear()
+    #end tearDown
+
+    def write(self, fname, text=''):
+        fout = open(fname, 'w')
+        fout.write(text)
+        fout.close()
+    #end write
+
+    def add_theme(self, name, svgs):
+        theme_dir = os.path.join(self.themes, name)
+        os.makedirs(theme_dir)
+        self.write(os.path.join(theme_dir, 'config'), '[theme]\ndescription = %s theme\n' % name)
+        for svg in svgs:
+            self.write(os.path.join(theme_dir, svg))
+        #end for
+    #end add_theme
+
+    def get_index(self):
+        return discovery.get_index([self.themes], [self.kbds], self.cache_dir)
+    #end get_index
+
+    def test_scan(self):
+        index = self.get_index()
+        path = os.path.join(self.themes, 'plain')
+        self.assertEqual(index['themes'], {'plain': ('plain theme', path)})
+        self.assertEqual \
+          (
+            index['theme_files'][path],
+            {
+                'alt': 'alt.svg', 'alt-small': 'alt-small.svg',
+                'ctrl': 'ctrl.svg', 'ctrl-small': 'ctrl.svg',
+            }
+          )
+        self.assertEqual(index['kbd_files'], [os.path.join(self.kbds, 'us.kbd')])
+    #end test_scan
+
+    def test_cached_index_is_used(self):
+        self.get_index()
+        discovery._indexes.clear()
+        scan = discovery.scan
+        discovery.scan = None
+        try:
+            index = self.get_index()
+        finally:
+            discovery.scan = scan
+        #end try
+        self.assertIn('plain', index['themes'])
+    #end test_cached_index_is_used
+
+    def test_changed_directory_is_scanned_again(self):
+        self.get_index()
+        self.add_theme('other', ('alt.svg',))
+        stat = os.stat(self.themes)
+        os.utime(self.themes, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+        self.assertEqual(sorted(self.get_index()['themes']), ['other', 'plain'])
+    #end test_changed_directory_is_scanned_again
+
+#end TestDiscovery
+
+if __name__ == '__main__':
+    unittest.main()
+#end if
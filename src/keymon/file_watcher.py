@@ -0,0 +1,155 @@
+#!/usr/bin/python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Find out when files are written, with inotify.
+
+A single inotify file descriptor, called from libc through ctypes, is
+watched by the GLib main loop, so nothing runs until a file is written.
+Directories are watched rather than files, since editors often save by
+writing a new file and renaming it over the old one.
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+from gi.repository import \
+    GLib
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO
+  # a file was written, or renamed to its name
+
+EVENT = struct.Struct('iIII')
+  # wd, mask, cookie and length of the name following it
+
+def parse_events(data):
+    """Yield the (watch descriptor, mask, name) of each inotify event read
+    into data."""
+    pos = 0
+    while pos + EVENT.size <= len(data):
+        wd, mask, _, length = EVENT.unpack_from(data, pos)
+        pos += EVENT.size
+        name = data[pos:pos + length].rstrip(b'\0')
+        pos += length
+        yield wd, mask, os.fsdecode(name)
+    #end while
+#end parse_events
+
+class FileWatcher:
+    """Calls a function with the files written in each directory watched."""
+
+    def __init__(self):
+        self.fd = None
+        self.source = None
+        self.dirs = {}
+          # watch descriptor to (directory, callback)
+        self.libc = None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno = True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError) as err:
+            logging.info('Not watching files, no inotify: %s', err)
+            return
+        #end try
+        if fd < 0:
+            logging.info('Not watching files: %s', os.strerror(ctypes.get_errno()))
+            return
+        #end if
+        self.libc = libc
+        self.fd = fd
+        self.source = GLib.io_add_watch \
+          (
+            self.fd,
+            GLib.PRIORITY_DEFAULT,
+            GLib.IOCondition.IN,
+            self._on_readable
+          )
+    #end __init__
+
+    def watch(self, dirname, callback):
+        """Call callback with the list of the full names of the files written
+        in the directory dirname, once for all those seen at the same time.
+        Watching the same directory again replaces its callback.
+        Returns:
+          False if the directory can't be watched.
+        """
+        if self.fd is None:
+            return False
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dirname), WATCH_MASK)
+        if wd < 0:
+            logging.info('Unable to watch %r: %s', dirname, os.strerror(ctypes.get_errno()))
+            return False
+        #end if
+        logging.debug('Watching %r', dirname)
+        self.dirs[wd] = (dirname, callback)
+        return True
+    #end watch
+
+    def unwatch(self, dirname):
+        """Stop watching the directory dirname, if it was watched."""
+        for wd, (watched, _) in list(self.dirs.items()):
+            if watched == dirname:
+                if self.libc.inotify_rm_watch(self.fd, wd) < 0:
+                    logging.info('Unable to stop watching %r: %s', dirname, os.strerror(ctypes.get_errno()))
+                #end if
+                logging.debug('Not watching %r', dirname)
+                del self.dirs[wd]
+            #end if
+        #end for
+    #end unwatch
+
+    def _on_readable(self, unused_fd, unused_condition):
+        written = {}
+          # watch descriptor to the names written, in order, without duplicates
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            #end try
+            for wd, mask, name in parse_events(data):
+                if mask & IN_Q_OVERFLOW:
+                    logging.warning('Missed some changed files')
+                elif wd in self.dirs and name:
+                    written.setdefault(wd, dict())[name] = None
+                #end if
+            #end for
+        #end while
+        for wd, names in written.items():
+            dirname, callback = self.dirs[wd]
+            callback([os.path.join(dirname, name) for name in names])
+        #end for
+        return True
+    #end _on_readable
+
+    def close(self):
+        """Stop watching all the directories."""
+        if self.source is not None:
+            GLib.source_remove(self.source)
+            self.source = None
+        #end if
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        #end if
+        self.dirs = {}
+    #end close
+
+#end FileWatcher
@@ -0,0 +1,264 @@
+#!/usr/bin/python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Paint all the buttons on a single widget.
+
+Instead of one Gtk.Image per button, a KeyCanvas paints the images of its
+slots side by side.  Switching the image of a slot only repaints the
+rectangle of that slot.  The layout is computed when the slots or their
+visibility change, and when an image does not fit in its slot.  The
+"images-changed" signal is emitted whenever a slot shows another image, so
+the shape of the window can follow.
+
+The slots of the key history are painted in places of the same width
+which do not move: when the history rotates, the ring is painted from its
+oldest slot on and only the places now showing another image are
+repainted.
+"""
+
+import gi
+gi.require_version("Gtk", "3.0")
+from gi.repository import \
+    Gdk, \
+    GObject, \
+    Gtk
+
+from keymon import lazy_pixbuf_creator
+from keymon import two_state_image
+
+def _unallocated():
+    alloc = Gdk.Rectangle()
+    alloc.x = -1
+      # not laid out yet
+    return alloc
+#end _unallocated
+
+class KeySlot(two_state_image.TwoState):
+    """A button painted by a KeyCanvas."""
+
+    def __init__(self, canvas, pixbufs, normal, is_modifier, show = True, timers = None):
+        self.canvas = canvas
+        self.image = None
+        self.visible = False
+        two_state_image.TwoState.__init__(self, pixbufs, normal, is_modifier, show, timers)
+    #end __init__
+
+    def set_image(self, img):
+        self.image = img
+        self.canvas.image_changed(self)
+    #end set_image
+
+    def show(self):
+        if not self.visible:
+            self.visible = True
+            self.canvas.relayout()
+        #end if
+    #end show
+
+    def hide(self):
+        if self.visible:
+            self.visible = False
+            self.canvas.relayout()
+        #end if
+    #end hide
+
+    def get_visible(self):
+        return self.visible
+    #end get_visible
+
+    def get_allocation(self):
+        return self.canvas.allocation_of(self)
+    #end get_allocation
+
+#end KeySlot
+
+class KeyCanvas(Gtk.DrawingArea):
+    """Widget painting the images of a row of KeySlots followed by a key
+    history."""
+
+    __gsignals__ = \
+        {
+            'images-changed' :
+                (
+                    GObject.SIGNAL_RUN_LAST,
+                    GObject.TYPE_NONE,
+                    (),
+                )
+        }
+
+    def __init__(self):
+        Gtk.DrawingArea.__init__(self)
+        self.slots = []
+          # slots before the key history, left to right
+        self.allocations = {}
+          # each of self.slots to its rectangle
+        self.history = None
+          # a key_history.KeyHistory of KeySlots
+        self.places = []
+          # rectangle of each place of the key history, oldest first
+        self.painted = []
+          # image last damaged in each place
+        self.connect('draw', self._on_draw)
+    #end __init__
+
+    def set_slots(self, slots, history):
+        """Paint these slots, from left to right, then the key history."""
+        self.slots = list(slots)
+        self.allocations = dict((slot, _unallocated()) for slot in self.slots)
+        self.history = history
+        self.places = []
+        self.relayout()
+    #end set_slots
+
+    def allocation_of(self, slot):
+        """Return the rectangle slot is painted in."""
+        place = self.history.position(slot) if self.history else None
+        if place is not None:
+            if place < len(self.places):
+                return self.places[place]
+            #end if
+            return _unallocated()
+        #end if
+        return self.allocations.get(slot) or _unallocated()
+    #end allocation_of
+
+    def image_changed(self, slot):
+        """Repaint slot, laying all the slots out again if it no longer fits."""
+        alloc = self.allocation_of(slot)
+        if alloc.x == -1 or not slot.visible:
+            return
+        width, height = lazy_pixbuf_creator.image_size(slot.image)
+        if width > alloc.width or height > alloc.height:
+            self.relayout()
+            return
+        #end if
+        place = self.history.position(slot) if self.history else None
+        if place is not None:
+            self.painted[place] = slot.image
+        #end if
+        self.queue_draw_area(alloc.x, alloc.y, alloc.width, alloc.height)
+        self.emit('images-changed')
+    #end image_changed
+
+    def rotated(self):
+        """The key history rotated, repaint the places whose image changed."""
+        changed = False
+        for place, slot in enumerate(self.history.slots()):
+            if place < len(self.places) and slot.image is not self.painted[place]:
+                self.painted[place] = slot.image
+                alloc = self.places[place]
+                self.queue_draw_area(alloc.x, alloc.y, alloc.width, alloc.height)
+                changed = True
+            #end if
+        #end for
+        if changed:
+            self.emit('images-changed')
+        #end if
+    #end rotated
+
+    def reset_layout(self):
+        """Lay the slots out again from the size of their current images
+        alone, after the images got smaller."""
+        for alloc in self.allocations.values():
+            alloc.x = -1
+        #end for
+        self.places = []
+        self.relayout()
+    #end reset_layout
+
+    def relayout(self):
+        """Compute the position of every visible slot and of the places of
+        the key history."""
+        x = 0
+        height = 0
+        for slot in self.slots:
+            alloc = self.allocations[slot]
+            if not slot.visible or slot.image is None:
+                continue
+            width, img_height = lazy_pixbuf_creator.image_size(slot.image)
+            if alloc.x != -1:
+                # slots only grow, so the layout settles after a few keys.
+                width = max(width, alloc.width)
+                img_height = max(img_height, alloc.height)
+            #end if
+            alloc.x = x
+            alloc.width = width
+            alloc.height = img_height
+            x += width
+            height = max(height, img_height)
+        #end for
+        keys = self.history.slots() if self.history else []
+        place_width = max((alloc.width for alloc in self.places), default = 0)
+        for slot in keys:
+            if slot.image is not None:
+                width, img_height = lazy_pixbuf_creator.image_size(slot.image)
+                place_width = max(place_width, width)
+                height = max(height, img_height)
+            #end if
+        #end for
+        self.places = []
+        for _ in keys:
+            alloc = Gdk.Rectangle()
+            alloc.x = x
+            alloc.width = place_width
+            self.places.append(alloc)
+            x += place_width
+        #end for
+        self.painted = [slot.image for slot in keys]
+        for alloc in list(self.allocations.values()) + self.places:
+            alloc.y = 0
+            alloc.height = height
+        #end for
+        self.set_size_request(x, height)
+        self.queue_resize()
+        self.queue_draw()
+        self.emit('images-changed')
+    #end relayout
+
+    def _on_draw(self, unused_widget, gc):
+        x1, y1, x2, y2 = gc.clip_extents()
+        painted = [(slot, self.allocations[slot]) for slot in self.slots]
+        if self.history:
+            painted.extend(zip(self.history.slots(), self.places))
+        #end if
+        for slot, alloc in painted:
+            if (
+                    not slot.visible
+                or
+                    slot.image is None
+                or
+                    alloc.x == -1
+                or
+                    alloc.x >= x2
+                or
+                    alloc.x + alloc.width <= x1
+            ):
+                continue
+            width, height = lazy_pixbuf_creator.image_size(slot.image)
+            # centered in its slot, like Gtk.Image does.
+            gc.set_source_surface \
+              (
+                slot.image,
+                alloc.x + (alloc.width - width) // 2,
+                alloc.y + (alloc.height - height) // 2
+              )
+            gc.rectangle(alloc.x, alloc.y, alloc.width, alloc.height)
+            gc.fill()
+        #end for
+        return False
+    #end _on_draw
+
+#end KeyCanvas
@@ -0,0 +1,135 @@
+#!/usr/bin/python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""The strip of the last keys pressed, as a ring of slots.
+
+Each slot (a TwoState) holds one key and its own countdown.  A new key
+goes into the oldest slot, which is then shown last: the other slots keep
+their images.  How much showing them in their new order costs is up to
+the caller, see KeyMon.key_history_rotated().
+
+Usage: python3 -m keymon.key_history
+  times a key against passing every image down a chain of slots.
+"""
+
+class KeyHistory:
+    """Ring of key slots, shown oldest first.  Stands in for the key
+    image in KeyMon._handle_event."""
+
+    def __init__(self, slots, rotated):
+        """Args:
+          slots: the slots in the order they are shown, the last one is the
+            newest.
+          rotated: function called with the slot that went from being shown
+            first to being shown last.
+        """
+        self.ring = list(slots)
+        self.oldest = 0
+          # index in self.ring
+        self.indexes = dict((slot, i) for i, slot in enumerate(self.ring))
+        self.rotated = rotated
+    #end __init__
+
+    @property
+    def newest(self):
+        "the slot showing the last key."
+        return self.ring[self.oldest - 1]
+    #end newest
+
+    def slots(self):
+        """Return the slots in the order they are shown."""
+        return self.ring[self.oldest:] + self.ring[:self.oldest]
+    #end slots
+
+    def position(self, slot):
+        """Return where slot is shown, from 0 for the oldest, or None if it
+        is not one of the slots."""
+        index = self.indexes.get(slot)
+        if index is None:
+            return None
+        return (index - self.oldest) % len(self.ring)
+    #end position
+
+    @property
+    def button_is_down(self):
+        return self.newest.button_is_down
+    #end button_is_down
+
+    @button_is_down.setter
+    def button_is_down(self, button_is_down):
+        self.newest.button_is_down = button_is_down
+    #end button_is_down
+
+    def switch_to(self, name):
+        """Show the key with this name, keeping the previous one in the
+        history if it is still shown."""
+        slot = self.newest
+        if slot.showing_button_down and len(self.ring) > 1:
+            slot = self.ring[self.oldest]
+            self.oldest = (self.oldest + 1) % len(self.ring)
+            self.rotated(slot)
+        #end if
+        slot.switch_to(name)
+    #end switch_to
+
+    def switch_to_default(self):
+        self.newest.switch_to_default()
+    #end switch_to_default
+
+#end KeyHistory
+
+def _run_benchmark():
+    """Compare a key going into the ring to it going into the newest slot
+    and every image moving down a chain of slots, as before."""
+    import timeit
+
+    class Slot:
+        def __init__(self):
+            self.current = 'KEY_EMPTY'
+            self.button_is_down = False
+        #end __init__
+        showing_button_down = property(lambda self: self.current != 'KEY_EMPTY')
+        def switch_to(self, name):
+            self.current = name
+        #end switch_to
+    #end Slot
+
+    for length in (1, 5, 20, 100):
+        chain = [Slot() for _ in range(length)]
+        history = KeyHistory([Slot() for _ in range(length)], lambda slot: None)
+
+        def by_chain():
+            for i in range(len(chain) - 1):
+                chain[i].switch_to(chain[i + 1].current)
+            #end for
+            chain[-1].switch_to('KEY_A')
+        #end by_chain
+
+        def by_ring():
+            history.switch_to('KEY_A')
+        #end by_ring
+
+        times = []
+        for func in (by_chain, by_ring):
+            times.append(min(timeit.repeat(func, number = 10000, repeat = 5)) * 1000000 / 10000)
+        #end for
+        print('%3d slots: chain %.3f us, ring %.3f us per key' % ((length,) + tuple(times)))
+    #end for
+#end _run_benchmark
+
+if __name__ == '__main__':
+    _run_benchmark()
+#end if
@@ -0,0 +1,108 @@
+#!/usr/bin/python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import key_history
+
+class Slot:
+    """Just enough of a TwoState."""
+
+    def __init__(self):
+        self.current = 'KEY_EMPTY'
+        self.button_is_down = False
+    #end __init__
+
+    @property
+    def showing_button_down(self):
+        return self.current != 'KEY_EMPTY'
+    #end showing_button_down
+
+    def switch_to(self, name):
+        self.current = name
+    #end switch_to
+
+    def switch_to_default(self):
+        self.current = 'KEY_EMPTY'
+    #end switch_to_default
+
+#end Slot
+
+class TestKeyHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.shown = [Slot() for _ in range(3)]
+          # slots in the order they are shown
+        self.history = key_history.KeyHistory(self.shown, self.rotated)
+    #end setUp
+
+    def rotated(self, slot):
+        self.shown.remove(slot)
+        self.shown.append(slot)
+    #end rotated
+
+    def labels(self):
+        return [slot.current for slot in self.shown]
+    #end labels
+
+    def press(self, name):
+        # as KeyMon._handle_event does.
+        self.history.switch_to(name)
+        self.history.button_is_down = True
+    #end press
+
+    def release(self):
+        self.history.button_is_down = False
+        self.history.switch_to_default()
+    #end release
+
+    def test_first_key(self):
+        self.history.switch_to('KEY_A')
+        self.assertEqual(self.labels(), ['KEY_EMPTY', 'KEY_EMPTY', 'KEY_A'])
+    #end test_first_key
+
+    def test_keys_shift_left(self):
+        for name in ('KEY_A', 'KEY_B', 'KEY_C', 'KEY_D'):
+            self.history.switch_to(name)
+        #end for
+        self.assertEqual(self.labels(), ['KEY_B', 'KEY_C', 'KEY_D'])
+        self.assertIs(self.history.newest, self.shown[-1])
+        self.assertEqual(self.history.slots(), self.shown)
+        self.assertEqual([self.history.position(slot) for slot in self.shown], [0, 1, 2])
+        self.assertIsNone(self.history.position(Slot()))
+    #end test_keys_shift_left
+
+    def test_expired_newest_is_reused(self):
+        self.history.switch_to('KEY_A')
+        self.history.switch_to_default()
+        self.history.switch_to('KEY_B')
+        self.assertEqual(self.labels(), ['KEY_EMPTY', 'KEY_EMPTY', 'KEY_B'])
+    #end test_expired_newest_is_reused
+
+    def test_button_is_down(self):
+        self.press('KEY_A')
+        self.press('KEY_B')
+        # the slot showing KEY_B is the one held down, not the one of KEY_A.
+        self.assertEqual(self.shown[-1].current, 'KEY_B')
+        self.assertTrue(self.shown[-1].button_is_down)
+        self.release()
+        self.assertFalse(self.shown[-1].button_is_down)
+    #end test_button_is_down
+
+#end TestKeyHistory
+
+if __name__ == '__main__':
+    unittest.main()
+#end if
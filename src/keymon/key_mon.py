@@ -22,6 +22,7 @@ Shows their status graphically.
 __author__ = 'Scott Kirkwood (scott+keymon@forusers.com)'
 __version__ = '1.50'
 
+import collections
 import logging
 import os
 import sys
@@ -38,11 +39,17 @@ from gi.repository import \
     Gtk
 
 from keymon import xlib
+from keymon import file_watcher
 from keymon import options
+from keymon import key_canvas
+from keymon import key_history
+from keymon import key_table
 from keymon import lazy_pixbuf_creator
 from keymon import mod_mapper
+from keymon import pointer_overlay
 from keymon import settings
 from keymon import shaped_window
+from keymon import timer_queue
 from keymon import two_state_image
 
 gettext.install('key-mon', 'locale')
@@ -70,9 +77,208 @@ def fix_svg_key_closure(fname, from_tos):
     #end fix_svg_key
 
 #begin fix_svg_key_closure
+    # lets lazy_pixbuf_creator find pre-rendered copies of this image.
+    fix_svg_key.signature = (fname, ':' + '|'.join(b.decode() for a, b in from_tos))
     return fix_svg_key
 #end fix_svg_key_closure
 
+FADEOUT_SECS = 1.0
+  # duration of the fadeout after no_press_fadeout seconds without a key
+
+SAVE_DELAY_SECS = 2.0
+  # the options are saved once they stopped changing for that long
+SAVE_MAX_DELAY_SECS = 30.0
+  # but at least this often while they keep changing
+
+SHAPE_MASK_CACHE_SIZE = 64
+  # window shapes kept for when the same buttons and images come back
+
+HOT_OPTIONS = \
+    (
+        'only_combo', 'sticky_mode', 'emulate_middle', 'visible_click',
+        'follow_mouse', 'opacity', 'no_press_fadeout', 'x_pos', 'y_pos',
+    )
+  # options read for every event, through KeyMon.hot_options
+
+def svg_name(themepath, fname, svg_size):
+    """Return an svg filename given the theme path and size suffix."""
+    fullname = os.path.join(themepath, '%s%s.svg' % (fname, svg_size))
+    if svg_size and not os.path.exists(fullname):
+        # Small not found, defaulting to large size
+        fullname = os.path.join(themepath, '%s.svg' % fname)
+    #end if
+    return fullname
+#end svg_name
+
+def names_to_fnames(svg_name, scale, swap_buttons):
+    """Give a name to images.
+    Args:
+      svg_name: function which returns the theme's filename for an image.
+      scale: the scale the images will be rendered at.
+      swap_buttons: swap the meaning of left and right mouse buttons.
+    Returns:
+      dict of image name to list of image operations, see LazyPixbufCreator.
+    """
+    ftn = \
+        {
+            'MOUSE': [svg_name('mouse'),],
+            'BTN_MIDDLE': [svg_name('mouse'), svg_name('middle-mouse')],
+            'SCROLL_UP': [svg_name('mouse'), svg_name('scroll-up-mouse')],
+            'SCROLL_DOWN': [svg_name('mouse'), svg_name('scroll-dn-mouse')],
+
+            'REL_LEFT': [svg_name('mouse'), svg_name('scroll-lft-mouse')],
+            'REL_RIGHT': [svg_name('mouse'), svg_name('scroll-rgt-mouse')],
+            'SHIFT': [svg_name('shift')],
+            'SHIFT_EMPTY': [svg_name('shift'), svg_name('whiteout-72')],
+            'CTRL': [svg_name('ctrl')],
+            'CTRL_EMPTY': [svg_name('ctrl'), svg_name('whiteout-58')],
+            'META': [svg_name('meta'), svg_name('meta')],
+            'META_EMPTY': [svg_name('meta'), svg_name('whiteout-58')],
+            'ALT': [svg_name('alt')],
+            'ALT_EMPTY': [svg_name('alt'), svg_name('whiteout-58')],
+            'ALTGR': [svg_name('altgr')],
+            'ALTGR_EMPTY': [svg_name('altgr'), svg_name('whiteout-58')],
+            'KEY_EMPTY':
+                [
+                    lazy_pixbuf_creator.KeyLabel(svg_name('one-char-template'), ''),
+                    svg_name('whiteout-48'),
+                ],
+            'BTN_LEFTRIGHT':
+                [
+                    svg_name('mouse'), svg_name('left-mouse'),
+                    svg_name('right-mouse'),
+                ],
+            'BTN_LEFTMIDDLERIGHT':
+                [
+                    svg_name('mouse'), svg_name('left-mouse'),
+                    svg_name('middle-mouse'), svg_name('right-mouse'),
+                ],
+        }
+    if swap_buttons:
+        # swap the meaning of left and right
+        left_str = 'right'
+        right_str = 'left'
+    else:
+        left_str = 'left'
+        right_str = 'right'
+    #end if
+
+    ftn.update \
+      (
+        {
+            'BTN_RIGHT':
+                [
+                    svg_name('mouse'),
+                    svg_name('%s-mouse' % right_str),
+                ],
+            'BTN_LEFT':
+                [
+                    svg_name('mouse'),
+                    svg_name('%s-mouse' % left_str)
+                ],
+            'BTN_LEFTMIDDLE':
+                [
+                    svg_name('mouse'),
+                    svg_name('%s-mouse' % left_str),
+                    svg_name('middle-mouse'),
+                ],
+            'BTN_MIDDLERIGHT':
+                [
+                    svg_name('mouse'),
+                    svg_name('middle-mouse'),
+                    svg_name('%s-mouse' % right_str),
+                ],
+        }
+      )
+
+    if scale >= 1.0:
+        ftn.update \
+          (
+            {
+                'KEY_SPACE':
+                    [
+                        fix_svg_key_closure
+                          (
+                            svg_name('two-line-wide'),
+                            [('TOP', 'Space'), ('BOTTOM', '')]
+                          ),
+                    ],
+                'KEY_TAB':
+                    [
+                        fix_svg_key_closure
+                          (
+                            svg_name('two-line-wide'),
+                            [('TOP', 'Tab'), ('BOTTOM', u'\u21B9')]
+                          )
+                    ],
+                'KEY_BACKSPACE':
+                    [
+                        fix_svg_key_closure
+                          (
+                            svg_name('two-line-wide'),
+                            [('TOP', 'Back'), ('BOTTOM', u'\u21fd')]
+                          )
+                    ],
+                'KEY_RETURN':
+                    [
+                        fix_svg_key_closure
+                          (
+                            svg_name('two-line-wide'),
+                            [('TOP', 'Enter'), ('BOTTOM', u'\u23CE')]
+                          )
+                    ],
+                'KEY_CAPS_LOCK':
+                    [
+                        fix_svg_key_closure
+                          (
+                            svg_name('two-line-wide'),
+                            [('TOP', 'Capslock'), ('BOTTOM', '')]
+                          )
+                    ],
+                'KEY_MULTI_KEY':
+                    [
+                        fix_svg_key_closure
+                          (
+                            svg_name('two-line-wide'),
+                            [('TOP', 'Compose'), ('BOTTOM', '')]
+                          )
+                    ],
+            }
+          )
+    else:
+        ftn.update \
+          (
+            {
+              'KEY_SPACE':
+                  [
+                      fix_svg_key_closure(svg_name('one-line-wide'), [('&amp;', 'Space')]),
+                  ],
+              'KEY_TAB':
+                  [
+                      fix_svg_key_closure(svg_name('one-line-wide'), [('&amp;', 'Tab')]),
+                  ],
+              'KEY_BACKSPACE':
+                  [
+                      fix_svg_key_closure(svg_name('one-line-wide'), [('&amp;', 'Back')]),
+                  ],
+              'KEY_RETURN':
+                  [
+                      fix_svg_key_closure(svg_name('one-line-wide'), [('&amp;', 'Enter')]),
+                  ],
+              'KEY_CAPS_LOCK':
+                  [
+                      fix_svg_key_closure(svg_name('one-line-wide'), [('&amp;', 'Capslck')]),
+                  ],
+              'KEY_MULTI_KEY':
+                  [
+                      fix_svg_key_closure(svg_name('one-line-wide'), [('&amp;', 'Compose')]),
+                  ],
+            }
+          )
+    #end if
+    return ftn
+#end names_to_fnames
+
 class KeyMon:
     """main KeyMon window class."""
 
@@ -93,11 +299,16 @@ class KeyMon:
             # creates the main window.
 
             def create_images():
-                self.images['MOUSE'] = two_state_image.TwoStateImage(self.pixbufs, 'MOUSE', False)
+                if self.options.canvas:
+                    self.canvas = key_canvas.KeyCanvas()
+                    self.canvas.connect('size_allocate', self.update_shape_mask)
+                    self.canvas.connect('images-changed', self.update_shape_mask)
+                    self.canvas.show()
+                #end if
+                self.images['MOUSE'] = self.new_button('MOUSE', False)
                 for img in self.MODS:
-                    self.images[img] = two_state_image.TwoStateImage \
+                    self.images[img] = self.new_button \
                       (
-                        pixbufs = self.pixbufs,
                         normal = img + '_EMPTY',
                         is_modifier = True,
                         show = self.enabled[img]
@@ -112,6 +323,7 @@ class KeyMon:
                 self.window.connect('button-press-event', self.button_pressed)
                 self.window.connect('button-release-event', self.button_released)
                 self.window.connect('leave-notify-event', self.pointer_leave)
+                self.window.connect('notify::scale-factor', self.scale_factor_changed)
                 self.event_box.connect('button_release_event', self.right_click_handler)
 
                 accelgroup = Gtk.AccelGroup()
@@ -127,7 +339,8 @@ class KeyMon:
                     return
                 #end if
 
-                GLib.idle_add(self.on_idle)
+                self.devices.notify = self.events_arrived
+                self.events_arrived()
             #end add_events
 
         #begin create_window
@@ -139,7 +352,7 @@ class KeyMon:
             self.window.set_default_size(round(width), round(height))
             self.window.set_decorated(self.options.decorated)
 
-            self.mouse_indicator_win = shaped_window.ShapedWindow \
+            self.mouse_indicators = shaped_window.ShapedWindowPool \
               (
                 self.svg_name('mouse-indicator'),
                 timeout=self.options.visible_click_timeout
@@ -148,14 +361,22 @@ class KeyMon:
               (
                 self.svg_name('mouse-follower')
               )
-            if self.options.follow_mouse:
+            use_overlays = self.options.pointer_overlay
+            if use_overlays and not pointer_overlay.supported():
+                logging.warning('No compositing manager, not using the pointer overlays')
+                use_overlays = False
+            #end if
+            if use_overlays:
+                self.pointer_overlays = pointer_overlay.PointerOverlays \
+                  (
+                    self.svg_name('mouse-indicator'),
+                    self.svg_name('mouse-follower'),
+                    self.options.visible_click_timeout
+                  )
+            elif self.options.follow_mouse:
                 self.mouse_follower_win.show()
             #end if
 
-            self.window_style_provider = Gtk.CssProvider()
-            self.window.get_style_context() \
-                .add_provider(self.window_style_provider, Gtk.STYLE_PROVIDER_PRIORITY_USER)
-
             self.set_window_opacity(self.options.opacity)
             self.window.set_keep_above(True)
 
@@ -207,38 +428,76 @@ class KeyMon:
         #end if
         # Make lint happy by defining these.
         self.hbox = None
+        self.canvas = None
         self.window = None
         self.event_box = None
-        self.mouse_indicator_win = None
+        self.mouse_indicators = None
+        self.pointer_overlays = None
         self.key_image = None
+        self.key_history = None
         self.buttons = None
+        self.theme_dir = None
+        self.theme_files = None
+        self.watched_theme_dir = None
+        self.pixbufs = None
 
         self.no_press_timer = None
+        self.fade_tick = None
+        self.fade_start = None
+        self.last_window_opacity = None
 
         self.move_dragged = False
+        self.save_pending = None
+          # when the first unsaved change of the options was made
         self.shape_mask_current = None
-        self.shape_mask_cache = {}
+        self.shape_mask_cache = collections.OrderedDict()
+          # least recently used first
 
         self.MODS = ['SHIFT', 'CTRL', 'META', 'ALT']
         self.IMAGES = ['MOUSE'] + self.MODS
         self.images = dict([(img, None) for img in self.IMAGES])
         self.enabled = dict([(img, self.get_option(img.lower())) for img in self.IMAGES])
 
+        self.render_config = self.get_render_config()
+        self.load_theme()
+        self.devices = xlib.XEvents()
+        self.devices.start()
         self.options.kbd_files = settings.get_kbd_files()
-        self.modmap = mod_mapper.safely_read_mod_map(self.options.kbd_file, self.options.kbd_files)
+        self.modmaps = mod_mapper.safely_read_group_mod_maps \
+          (
+            self.options.kbd_file,
+            self.options.kbd_files,
+            self.devices.local_display,
+            settings.get_cache_dir()
+          )
+          # one per XKB group
+        self.group = 0
+        self.level = 0
+          # shift level of the keys, from 0
+        self.level3_is_down = False
 
         self.name_fnames = self.create_names_to_fnames()
-        self.devices = xlib.XEvents()
-        self.devices.start()
+        self.build_key_tables()
+        self.events_pending = False
+        self.timers = timer_queue.TimerQueue()
+        self.hot_options = self.options.snapshot(HOT_OPTIONS)
+          # regenerated by settings_changed()
 
         self.pixbufs = lazy_pixbuf_creator.LazyPixbufCreator \
           (
             name_fnames = self.name_fnames,
-            resize = self.options.scale
+            resize = self.options.scale,
+            theme_dir = self.theme_dir,
+            device_scale = Gdk.get_default_root_window().get_scale_factor()
           )
         create_window()
+        self.watcher = file_watcher.FileWatcher()
+        self.watcher.watch(settings.get_config_dir(), self.config_files_changed)
+        self.watch_theme()
         self.fade_lock = 0
         self.reset_no_press_timer()
+        self.applied_options = self.options.values()
+          # what settings_changed() compares against
     #end __init__
 
     def get_option(self, attr):
@@ -298,180 +557,71 @@ class KeyMon:
         else:
             self.svg_size = ''
         #end if
-        ftn = \
-            {
-                'MOUSE': [self.svg_name('mouse'),],
-                'BTN_MIDDLE': [self.svg_name('mouse'), self.svg_name('middle-mouse')],
-                'SCROLL_UP': [self.svg_name('mouse'), self.svg_name('scroll-up-mouse')],
-                'SCROLL_DOWN': [self.svg_name('mouse'), self.svg_name('scroll-dn-mouse')],
-
-                'REL_LEFT': [self.svg_name('mouse'), self.svg_name('scroll-lft-mouse')],
-                'REL_RIGHT': [self.svg_name('mouse'), self.svg_name('scroll-rgt-mouse')],
-                'SHIFT': [self.svg_name('shift')],
-                'SHIFT_EMPTY': [self.svg_name('shift'), self.svg_name('whiteout-72')],
-                'CTRL': [self.svg_name('ctrl')],
-                'CTRL_EMPTY': [self.svg_name('ctrl'), self.svg_name('whiteout-58')],
-                'META': [self.svg_name('meta'), self.svg_name('meta')],
-                'META_EMPTY': [self.svg_name('meta'), self.svg_name('whiteout-58')],
-                'ALT': [self.svg_name('alt')],
-                'ALT_EMPTY': [self.svg_name('alt'), self.svg_name('whiteout-58')],
-                'ALTGR': [self.svg_name('altgr')],
-                'ALTGR_EMPTY': [self.svg_name('altgr'), self.svg_name('whiteout-58')],
-                'KEY_EMPTY':
-                    [
-                        fix_svg_key_closure(self.svg_name('one-char-template'), [('&amp;', '')]),
-                        self.svg_name('whiteout-48'),
-                    ],
-                'BTN_LEFTRIGHT':
-                    [
-                        self.svg_name('mouse'), self.svg_name('left-mouse'),
-                        self.svg_name('right-mouse'),
-                    ],
-                'BTN_LEFTMIDDLERIGHT':
-                    [
-                        self.svg_name('mouse'), self.svg_name('left-mouse'),
-                        self.svg_name('middle-mouse'), self.svg_name('right-mouse'),
-                    ],
-            }
-        if self.options.swap_buttons:
-            # swap the meaning of left and right
-            left_str = 'right'
-            right_str = 'left'
-        else:
-            left_str = 'left'
-            right_str = 'right'
-        #end if
-
-        ftn.update \
-          (
-            {
-                'BTN_RIGHT':
-                    [
-                        self.svg_name('mouse'),
-                        self.svg_name('%s-mouse' % right_str),
-                    ],
-                'BTN_LEFT':
-                    [
-                        self.svg_name('mouse'),
-                        self.svg_name('%s-mouse' % left_str)
-                    ],
-                'BTN_LEFTMIDDLE':
-                    [
-                        self.svg_name('mouse'),
-                        self.svg_name('%s-mouse' % left_str),
-                        self.svg_name('middle-mouse'),
-                    ],
-                'BTN_MIDDLERIGHT':
-                    [
-                        self.svg_name('mouse'),
-                        self.svg_name('middle-mouse'),
-                        self.svg_name('%s-mouse' % right_str),
-                    ],
-            }
-          )
+        ret = names_to_fnames(self.svg_name, self.options.scale, self.options.swap_buttons)
+        self.named_images = set(ret)
+          # the images not drawn from a key template
+        self.key_images = {}
+          # image name to (template, label) of the keys added by add_key_images()
+        return ret
+    #end create_names_to_fnames
 
-        if self.options.scale >= 1.0:
-            ftn.update \
-              (
-                {
-                    'KEY_SPACE':
-                        [
-                            fix_svg_key_closure
-                              (
-                                self.svg_name('two-line-wide'),
-                                [('TOP', 'Space'), ('BOTTOM', '')]
-                              ),
-                        ],
-                    'KEY_TAB':
-                        [
-                            fix_svg_key_closure
-                              (
-                                self.svg_name('two-line-wide'),
-                                [('TOP', 'Tab'), ('BOTTOM', u'\u21B9')]
-                              )
-                        ],
-                    'KEY_BACKSPACE':
-                        [
-                            fix_svg_key_closure
-                              (
-                                self.svg_name('two-line-wide'),
-                                [('TOP', 'Back'), ('BOTTOM', u'\u21fd')]
-                              )
-                        ],
-                    'KEY_RETURN':
-                        [
-                            fix_svg_key_closure
-                              (
-                                self.svg_name('two-line-wide'),
-                                [('TOP', 'Enter'), ('BOTTOM', u'\u23CE')]
-                              )
-                        ],
-                    'KEY_CAPS_LOCK':
-                        [
-                            fix_svg_key_closure
-                              (
-                                self.svg_name('two-line-wide'),
-                                [('TOP', 'Capslock'), ('BOTTOM', '')]
-                              )
-                        ],
-                    'KEY_MULTI_KEY':
-                        [
-                            fix_svg_key_closure
-                              (
-                                self.svg_name('two-line-wide'),
-                                [('TOP', 'Compose'), ('BOTTOM', '')]
-                              )
-                        ],
-                }
-              )
-        else:
-            ftn.update \
-              (
-                {
-                  'KEY_SPACE':
-                      [
-                          fix_svg_key_closure(self.svg_name('one-line-wide'), [('&amp;', 'Space')]),
-                      ],
-                  'KEY_TAB':
-                      [
-                          fix_svg_key_closure(self.svg_name('one-line-wide'), [('&amp;', 'Tab')]),
-                      ],
-                  'KEY_BACKSPACE':
-                      [
-                          fix_svg_key_closure(self.svg_name('one-line-wide'), [('&amp;', 'Back')]),
-                      ],
-                  'KEY_RETURN':
-                      [
-                          fix_svg_key_closure(self.svg_name('one-line-wide'), [('&amp;', 'Enter')]),
-                      ],
-                  'KEY_CAPS_LOCK':
-                      [
-                          fix_svg_key_closure(self.svg_name('one-line-wide'), [('&amp;', 'Capslck')]),
-                      ],
-                  'KEY_MULTI_KEY':
-                      [
-                          fix_svg_key_closure(self.svg_name('one-line-wide'), [('&amp;', 'Compose')]),
-                      ],
-                }
-              )
+    def build_key_tables(self):
+        """Work out what each scan code shows in each XKB group, for the
+        current keyboard maps and images, and add the images of the keys
+        drawn from a template."""
+        self.key_tables = \
+            [
+                key_table.KeyTable(modmap, self.options.scale, self.named_images, group)
+                for group, modmap in enumerate(self.modmaps)
+            ]
+        for table in self.key_tables:
+            self.add_key_images(table.infos())
+        #end for
+        self.set_group(self.group)
+    #end build_key_tables
+
+    def add_key_images(self, infos):
+        """Add the images of the keys with these KeyInfos drawn from a
+        template, replacing those of the same name with another label."""
+        replaced = False
+        for name, drawn_with in key_table.key_images(infos).items():
+            if self.key_images.get(name) == drawn_with:
+                continue
+            template, label = drawn_with
+            replaced = replaced or name in self.key_images
+            self.key_images[name] = drawn_with
+            self.name_fnames[name] = \
+                [
+                    lazy_pixbuf_creator.KeyLabel(self.svg_name(template), label),
+                ]
+            if self.pixbufs is not None:
+                self.pixbufs.forget(name)
+            #end if
+        #end for
+        if replaced:
+            # the masks of the old labels are cached under the same names.
+            self.shape_mask_cache.clear()
+            self.shape_mask_current = None
         #end if
-        return ftn
-    #end create_names_to_fnames
+    #end add_key_images
+
+    def set_group(self, group):
+        """Show the keys as in the XKB group (keyboard layout) group, those
+        without a keyboard map of their own as in the first one."""
+        self.group = group
+        if group >= len(self.key_tables):
+            group = 0
+        #end if
+        self.modmap = self.modmaps[group]
+        self.key_table = self.key_tables[group]
+    #end set_group
+
 
     def set_window_opacity(self, opacity) :
+        if opacity == self.last_window_opacity:
+            return
         self.last_window_opacity = opacity
-        style = \
-            (
-                "window\n"
-                "  {\n"
-                "    opacity : %(opacity).3f;\n"
-                "  }\n"
-            %
-                {
-                    "opacity" : opacity,
-                }
-            )
-        self.window_style_provider.load_from_data(style.encode())
+        self.window.set_opacity(opacity)
     #end set_window_opacity
 
     def update_shape_mask(self, *unused_args, **kwargs):
@@ -485,10 +635,10 @@ class KeyMon:
 
             btns = [btn for btn in self.buttons if btn.get_visible()]
             # Generate id to see if current mask needs to be updated, which is a tuple
-            # of allocation of buttons.
+            # of allocation and image of buttons.
             cache_id = tuple \
               (
-                (a.x, a.y, a.width, a.height)
+                (a.x, a.y, a.width, a.height, btn.current)
                 for btn in btns
                 for a in (btn.get_allocation(),)
               )
@@ -496,64 +646,71 @@ class KeyMon:
                 return
 
             # Try to find existing mask in cache
-            # TODO limit number of cached masks
             shape_mask = self.shape_mask_cache.get(cache_id, None)
             if shape_mask and not force:
-                self.window.get_property("window").shape_combine_region(shape_mask, 0, 0)
+                self.shape_mask_cache.move_to_end(cache_id)
+                gdk_window.shape_combine_region(shape_mask, 0, 0)
                 self.shape_mask_current = cache_id
                 return
             #end if
 
-            alloc = self.window.get_allocation()
-            width = alloc.width
-            height = alloc.height
-            masks = \
-                [
-                    Gdk.cairo_surface_create_from_pixbuf(self.pixbufs.get(btn.current), 1, None)
-                    for btn in btns
-                ]
-            shape_mask = cairo.ImageSurface(cairo.Format.ARGB32, width, height)
-              # not bothering to do equivalent of masks[0].get_depth()
-
-            gc = cairo.Context(shape_mask)
-            # Initialize the mask just in case masks of buttons can't fill the window,
-            # if that happens, some artifacts will be seen usually at right edge.
-            gc.set_source_rgba \
-              (
-                *(4 * ((1, 0)[self.options.backgroundless],))
-              )
-            gc.new_path()
-            gc.rectangle(0, 0, width, height)
-            gc.fill()
-
-            for btn_allocation, mask in zip(cache_id, masks):
+            # Union of the regions of the images, each one computed only once
+            # per image by self.pixbufs, clipped to the allocation of its button.
+            shape_mask = cairo.Region()
+            for x, y, width, height, current in cache_id:
                 # Don't create mask until every image is allocated
-                if btn_allocation[0] == -1:
+                if x == -1:
                     return
-                gc.set_source_surface(mask, btn_allocation[0], btn_allocation[1])
-                gc.new_path()
-                gc.rectangle(*btn_allocation)
-                gc.fill()
+                region = self.pixbufs.get_region(current).copy()
+                region.translate(x, y)
+                region.intersect(cairo.RectangleInt(x, y, width, height))
+                shape_mask.union(region)
             #end for
 
-            gc = None
-            shape_mask.flush()
-            shape_mask = Gdk.cairo_region_create_from_surface(shape_mask)
             gdk_window.shape_combine_region(shape_mask, 0, 0)
             self.shape_mask_current = cache_id
             self.shape_mask_cache[cache_id] = shape_mask
+            if len(self.shape_mask_cache) > SHAPE_MASK_CACHE_SIZE:
+                self.shape_mask_cache.popitem(last=False)
+            #end if
         else :
             gdk_window.shape_combine_region(None, 0, 0)
         #end if
     #end update_shape_mask
 
+    def scale_factor_changed(self, *unused_args):
+        "re-renders the images if the window moved to a monitor with another scale factor."
+        if self.pixbufs.set_device_scale(self.window.get_scale_factor()):
+            for but in self.buttons:
+                but.redraw()
+            #end for
+            self.update_shape_mask(force=True)
+        #end if
+    #end scale_factor_changed
+
+    def new_button(self, normal, is_modifier, show=True):
+        """Create a button as a widget, or as a slot of the canvas."""
+        if self.canvas:
+            return key_canvas.KeySlot \
+              (
+                self.canvas, self.pixbufs, normal, is_modifier, show,
+                timers = self.timers
+              )
+        #end if
+        return two_state_image.TwoStateImage \
+          (
+            self.pixbufs, normal, is_modifier, show,
+            timers = self.timers
+          )
+    #end new_button
+
     def create_buttons(self):
         self.buttons = list(self.images[img] for img in self.IMAGES)
         for _ in range(self.options.old_keys):
-            key_image = two_state_image.TwoStateImage(self.pixbufs, 'KEY_EMPTY', False)
+            key_image = self.new_button('KEY_EMPTY', False)
             self.buttons.append(key_image)
         #end for
-        self.key_image = two_state_image.TwoStateImage(self.pixbufs, 'KEY_EMPTY', False)
+        self.key_image = self.new_button('KEY_EMPTY', False)
         self.buttons.append(self.key_image)
         for but in self.buttons:
             if but.normal == 'MOUSE':
@@ -561,7 +718,9 @@ class KeyMon:
             else:
                 but.timeout_secs = self.options.key_timeout
             #end if
-            but.connect('size_allocate', self.update_shape_mask)
+            if not self.canvas:
+                but.connect('size_allocate', self.update_shape_mask)
+            #end if
         #end for
     #end create_buttons
 
@@ -573,40 +732,149 @@ class KeyMon:
             if not self.enabled[img]:
                 self.images[img].hide()
             #end if
-            self.hbox.pack_start(self.images[img], False, False, 0)
+            if not self.canvas:
+                self.hbox.pack_start(self.images[img], False, False, 0)
+            #end if
         #end for
 
-        prev_key_image = None
-        for key_image in self.buttons[-(self.options.old_keys + 1):-1]:
-            #key_image.hide()
-            #key_image.timeout_secs = 0.5
-            key_image.defer_to = prev_key_image
-            self.hbox.pack_start(key_image, True, True, 0)
-            prev_key_image = key_image
-        #end for
+        key_slots = self.buttons[-(self.options.old_keys + 1):]
+        self.key_history = key_history.KeyHistory(key_slots, self.key_history_rotated)
+        if self.canvas:
+            # all buttons are painted by the canvas, laid out once here.
+            self.canvas.set_slots(self.buttons[:len(self.IMAGES)], self.key_history)
+            self.hbox.pack_start(self.canvas, True, True, 0)
+        else:
+            for key_image in key_slots:
+                self.hbox.pack_start(key_image, True, True, 0)
+            #end for
+        #end if
+    #end layout_boxes
+
+    def key_history_rotated(self, key_image):
+        """key_image went from showing the oldest key to the newest one.  The
+        canvas repaints the places whose image changed, a box has to move the
+        widget to the end, which reallocates all of them."""
+        if self.canvas:
+            self.canvas.rotated()
+        else:
+            self.hbox.reorder_child(key_image, -1)
+        #end if
+    #end key_history_rotated
+
+    def resize_key_history(self):
+        """Add or remove old key slots to match options.old_keys, keeping the
+        other buttons as they are."""
+        key_slots = self.key_history.slots()
+        wanted = self.options.old_keys + 1
+        if wanted > len(key_slots):
+            added = [self.new_button('KEY_EMPTY', False) for _ in range(wanted - len(key_slots))]
+            for i, key_image in enumerate(added):
+                key_image.timeout_secs = self.options.key_timeout
+                if not self.canvas:
+                    key_image.connect('size_allocate', self.update_shape_mask)
+                    self.hbox.pack_start(key_image, True, True, 0)
+                    # the oldest keys are shown first.
+                    self.hbox.reorder_child(key_image, len(self.IMAGES) + i)
+                #end if
+            #end for
+            key_slots = added + key_slots
+        else:
+            removed = key_slots[:len(key_slots) - wanted]
+            for key_image in removed:
+                key_image.count_down = None
+                if not self.canvas:
+                    self.hbox.remove(key_image)
+                #end if
+            #end for
+            key_slots = key_slots[len(removed):]
+        #end if
+        self.buttons = list(self.images[img] for img in self.IMAGES) + key_slots
+        self.key_image = key_slots[-1]
+        self.key_history = key_history.KeyHistory(key_slots, self.key_history_rotated)
+        if self.canvas:
+            self.canvas.set_slots(self.buttons[:len(self.IMAGES)], self.key_history)
+        #end if
+    #end resize_key_history
 
-        # This must be after the loop above.
-        #self.key_image.timeout_secs = 0.5
+    def get_render_config(self):
+        """The options which the rendered images depend on."""
+        return (self.options.theme, self.options.scale, self.options.swap_buttons)
+    #end get_render_config
 
-        self.key_image.defer_to = prev_key_image
-        self.hbox.pack_start(self.key_image, True, True, 0)
-    #end layout_boxes
+    def load_theme(self):
+        """Locate the files of the current theme."""
+        self.theme_dir, self.theme_files = settings.open_theme \
+          (
+            self.options.themes[self.options.theme][1]
+          )
+    #end load_theme
+
+    def watch_theme(self):
+        """Render the images again when the files of the theme are edited.
+        Compiled themes are not watched, only their extracted copy is used.
+        The directory of the previous theme is no longer watched."""
+        if self.watched_theme_dir is not None:
+            self.watcher.unwatch(self.watched_theme_dir)
+            self.watched_theme_dir = None
+        #end if
+        if self.theme_dir == self.options.themes[self.options.theme][1]:
+            if self.watcher.watch(self.theme_dir, self.theme_files_changed):
+                self.watched_theme_dir = self.theme_dir
+            #end if
+        #end if
+    #end watch_theme
+
+    def theme_files_changed(self, fnames):
+        """Files of a theme directory were written, drop the images drawn
+        from them and show the new ones."""
+        names = set()
+        for fname in fnames:
+            if fname.endswith('.svg'):
+                names |= self.pixbufs.invalidate_file(fname)
+            #end if
+        #end for
+        if not names:
+            return
+        logging.info('Images changed: %s', ', '.join(sorted(names)))
+        for but in self.buttons:
+            if but.current in names:
+                but.redraw()
+            #end if
+        #end for
+        self.shape_mask_cache.clear()
+        self.update_shape_mask(force=True)
+    #end theme_files_changed
+
+    def config_files_changed(self, fnames):
+        """Files of the config directory were written, apply the options
+        changed in the ini file, if it was one of them."""
+        if self.options.ini_filename not in fnames:
+            return
+        self.options.reread_ini_file()
+        if self.options.theme not in self.options.themes:
+            logging.warning('Theme %r does not exist', self.options.theme)
+            self.options.theme = self.render_config[0]
+        #end if
+        self.settings_changed(None)
+    #end config_files_changed
 
     def svg_name(self, fname):
         """Return an svg filename given the theme, system."""
-        themepath = self.options.themes[self.options.theme][1]
-        fullname = os.path.join(themepath, '%s%s.svg' % (fname, self.svg_size))
-        if self.svg_size and not os.path.exists(fullname):
-            # Small not found, defaulting to large size
-            fullname = os.path.join(themepath, '%s.svg' % fname)
+        if self.theme_files is not None:
+            # the fallback to large size is already resolved.
+            return os.path.join \
+              (
+                self.theme_dir,
+                self.theme_files.get(fname + self.svg_size, fname + '.svg')
+              )
         #end if
-        return fullname
+        return svg_name(self.theme_dir, fname, self.svg_size)
     #end svg_name
 
     def button_released(self, unused_widget, evt):
         """A mouse button was released."""
         if evt.button == 1:
-            self.set_window_opacity(self.options.opacity)
+            self.set_window_opacity(self.hot_options.opacity)
             self.clear_no_press_timer()
             self.move_dragged = None
         #end if
@@ -618,7 +886,7 @@ class KeyMon:
         self.set_accept_focus(True)
         if evt.button == 1:
             self.move_dragged = widget.get_pointer()
-            self.set_window_opacity(self.options.opacity)
+            self.set_window_opacity(self.hot_options.opacity)
             self.clear_no_press_timer()
         #end if
         return True
@@ -650,36 +918,71 @@ class KeyMon:
         logging.info('Moved window to %d, %d' % (x, y))
         self.options.x_pos = x
         self.options.y_pos = y
+        self.hot_options = self.hot_options._replace(x_pos = x, y_pos = y)
+        self.save_options_later()
     #end _window_moved
 
-    def on_idle(self):
-        """Check for events on idle."""
-        event = self.devices.next_event()
+    def save_options_later(self):
+        """Save the options once they stop changing, SAVE_DELAY_SECS from
+        now, or at most SAVE_MAX_DELAY_SECS after the first change."""
+        now = time.monotonic()
+        if self.save_pending is None:
+            self.save_pending = now
+        #end if
+        self.timers.schedule \
+          (
+            min(now + SAVE_DELAY_SECS, self.save_pending + SAVE_MAX_DELAY_SECS),
+            self.save_options
+          )
+    #end save_options_later
+
+    def save_options(self):
+        """Write the options to the ini file, if they changed."""
+        self.timers.cancel(self.save_options)
+        self.save_pending = None
+        try:
+            self.options.save()
+        except OSError as err:
+            logging.warning('Unable to save the options: %s', err)
+        #end try
+    #end save_options
+
+    def events_arrived(self):
+        """Called from the X thread when it has queued events."""
+        if not self.events_pending:
+            self.events_pending = True
+            GLib.idle_add(self.on_events)
+        #end if
+    #end events_arrived
+
+    def on_events(self):
+        """Handle the queued events.  The buttons go back to normal on their
+        own, through self.timers."""
+        # cleared first, so events queued from now on schedule another call.
+        self.events_pending = False
         try:
-            if event:
+            while True:
+                event = self.devices.next_event()
+                if not event:
+                    break
                 self.handle_event(event)
-            else:
-                for button in self.buttons:
-                    button.empty_event()
-                #end for
-            #end if
-            time.sleep(0.01)
+            #end while
         except KeyboardInterrupt:
             self.quit_program()
-            return False
         #end try
-        return True  # continue calling
-    #end on_idle
+        return False
+    #end on_events
 
     def handle_event(self, event):
         """Handle an X event."""
         if event.type == 'EV_MOV':
-            if self.mouse_indicator_win.get_property('visible'):
-                self.mouse_indicator_win.center_on_cursor(*event.value)
-            #end if
+            self.mouse_indicators.pointer_moved(*event.value)
             if self.mouse_follower_win.get_property('visible'):
                 self.mouse_follower_win.center_on_cursor(*event.value)
             #end if
+            if self.pointer_overlays and self.hot_options.follow_mouse:
+                self.pointer_overlays.move_follower(*event.value)
+            #end if
             if self.move_dragged:
                 self._window_moved()
             #end if
@@ -687,7 +990,7 @@ class KeyMon:
             if type(event.code) == str:
                 if event.code.startswith('KEY'):
                     code_num = event.scancode
-                    self.handle_key(code_num, event.code, event.value)
+                    self.handle_key(code_num, event.code, event.value, event.group)
                 elif event.code.startswith('BTN'):
                     self.handle_mouse_button(event.code, event.value)
                 #end if
@@ -707,47 +1010,56 @@ class KeyMon:
             GLib.source_remove(self.no_press_timer)
             self.no_press_timer = None
         #end if
+        if self.fade_tick:
+            self.window.remove_tick_callback(self.fade_tick)
+            self.fade_tick = None
+        #end if
     #end clear_no_press_timer
 
     def reset_no_press_timer(self):
         """Initialize no_press_timer"""
         if not self.window.get_property('visible'):
-            self.window.move(self.options.x_pos, self.options.y_pos)
+            self.window.move(self.hot_options.x_pos, self.hot_options.y_pos)
             self.window.show()
         #end if
-        self.set_window_opacity(self.options.opacity)
+        self.set_window_opacity(self.hot_options.opacity)
         self.clear_no_press_timer()
-        if self.fade_lock == 0 and self.options.no_press_fadeout != 0 :
+        if self.fade_lock == 0 and self.hot_options.no_press_fadeout != 0 :
             self.no_press_timer = GLib.timeout_add \
               (
-                int(self.options.no_press_fadeout * 1000),
+                int(self.hot_options.no_press_fadeout * 1000),
                 self.no_press_fadeout
               )
         #end if
     #end reset_no_press_timer
 
-    def no_press_fadeout(self, begin=True):
-        """Fadeout the window in a second
-        Args:
-          begin: indicate if this timeout is requested by handle_event.
-        """
-        opacity = max(self.last_window_opacity - self.options.opacity / 10.0, 0)
-        logging.debug('Set opacity = %f' % opacity)
+    def no_press_fadeout(self):
+        """Fadeout the window in a second, one step per frame."""
+        self.no_press_timer = None
+        self.fade_start = None
+        self.fade_tick = self.window.add_tick_callback(self.fade_step)
+        return False
+    #end no_press_fadeout
+
+    def fade_step(self, unused_widget, frame_clock):
+        """Frame clock callback of the fadeout."""
+        now = frame_clock.get_frame_time()
+          # microseconds
+        if self.fade_start is None:
+            self.fade_start = now
+        #end if
+        progress = (now - self.fade_start) / (FADEOUT_SECS * 1000000)
+        opacity = max(self.hot_options.opacity * (1 - progress), 0)
         self.set_window_opacity(opacity)
         if opacity == 0.0:
+            logging.debug('Faded out')
             self.window.hide()
             # No need to fade out more
-            self.no_press_timer = None
-            return False
-        #end if
-        if begin:
-            # Recreate a new timer with 0.1 seccond interval
-            self.no_press_timer = GLib.timeout_add(100, self.no_press_fadeout)
-            # The current self.options.no_press_fadeout interval will not be timed
-            # out again.
+            self.fade_tick = None
             return False
         #end if
-    #end no_press_fadeout
+        return True
+    #end fade_step
 
     def _show_down_key(self, name):
         """Show the down key.
@@ -757,7 +1069,7 @@ class KeyMon:
         Returns:
           True if the key should be shown
         """
-        if not self.options.only_combo:
+        if not self.hot_options.only_combo:
             return True
         if self.is_shift_code(name):
             return True
@@ -768,19 +1080,21 @@ class KeyMon:
 
     def _handle_event(self, image, name, code):
         """Handle an event given image and code."""
-        image.button_is_down = code == 1
         if code == 1:
             if self._show_down_key(name):
                 logging.debug('Switch to %s, code %s' % (name, code))
                 image.switch_to(name)
             #end if
+            # only now, the key history may have gone on to another slot.
+            image.button_is_down = True
             return
         #end if
+        image.button_is_down = False
 
         # on key up
         if self.is_shift_code(name):
             # shift up is always shown
-            if not self.options.sticky_mode:
+            if not self.hot_options.sticky_mode:
                 image.switch_to_default()
             #end if
             return
@@ -798,72 +1112,39 @@ class KeyMon:
         return False
     #end is_shift_code
 
-    def handle_key(self, scan_code, xlib_name, value):
+    def handle_key(self, scan_code, xlib_name, value, group=0):
         """Handle a keyboard event."""
-        code, medium_name, short_name = self.modmap.get_and_check(scan_code, xlib_name)
-        if not code:
-            logging.info('No mapping for scan_code %s', scan_code)
-            return
-        #end if
-        if self.options.scale < 1.0 and short_name:
-            medium_name = short_name
+        if group != self.group:
+            logging.debug('Switch to keyboard group %d', group)
+            self.set_group(group)
         #end if
-        logging.debug('Scan code %s, Key %s pressed = %r', scan_code, code, medium_name)
-        if code in self.name_fnames:
-            self._handle_event(self.key_image, code, value)
-            return
-        #end if
-        for keysym, img in \
-          (
-            ('KEY_SHIFT', 'SHIFT'),
-            ('KEY_CONTROL', 'CTRL'),
-            ('KEY_ALT', 'ALT'),
-            ('KEY_ISO_LEVEL3_SHIFT', 'ALT'),
-            ('KEY_SUPER', 'META'),
-          ) \
-        :
-            if code.startswith(keysym):
-                if self.enabled[img]:
-                    if keysym == 'KEY_ISO_LEVEL3_SHIFT':
-                        self._handle_event(self.images['ALT'], 'ALTGR', value)
-                    else:
-                        self._handle_event(self.images[img], img, value)
-                    #end if
-                #end if
+        info = self.key_table.lookup(scan_code, xlib_name, self.level)
+        if info is None:
+            label = mod_mapper.key_label(xlib_name)
+            if not label:
+                logging.info('No mapping for scan_code %s', scan_code)
                 return
             #end if
-        #end for
-        if code.startswith('KEY_KP'):
-            letter = medium_name
-            if code not in self.name_fnames:
-                template = 'one-char-numpad-template'
-                self.name_fnames[code] = \
-                    [
-                        fix_svg_key_closure(self.svg_name(template), [('&amp;', letter)]),
-                    ]
-            #end if
-            self._handle_event(self.key_image, code, value)
-            return
+            # shown with its character from now on
+            infos = self.key_table.add_key(xlib_name, label)
+            self.add_key_images(infos)
+            info = infos[self.level]
         #end if
-
-        if code.startswith('KEY_'):
-            letter = medium_name
-            if code not in self.name_fnames:
-                logging.debug('code not in %s', code)
-                if len(letter) == 1:
-                    template = 'one-char-template'
-                else:
-                    template = 'multi-char-template'
-                #end if
-                self.name_fnames[code] = \
-                    [
-                        fix_svg_key_closure(self.svg_name(template), [('&amp;', letter)]),
-                    ]
+        logging.debug('Scan code %s, Key %s pressed = %r', scan_code, info.code, info.label)
+        if info.category == key_table.KEY:
+            self._handle_event(self.key_history, info.name, value)
+        elif info.category == key_table.MODIFIER:
+            image = self.images[info.image]
+            if self.enabled[info.image]:
+                self._handle_event(image, info.name, value)
             else:
-                logging.debug('code in %s', code)
+                # still needed for the shift level
+                image.button_is_down = value == 1
             #end if
-            self._handle_event(self.key_image, code, value)
-            return
+            if info.name == 'ALTGR':
+                self.level3_is_down = value == 1
+            #end if
+            self.level = int(self.images['SHIFT'].button_is_down) + 2 * int(self.level3_is_down)
         #end if
     #end handle_key
 
@@ -882,7 +1163,7 @@ class KeyMon:
                     #end if
                 #end for
                 if (
-                        self.options.emulate_middle
+                        self.hot_options.emulate_middle
                     and
                         (
                             self.images['MOUSE'].current == 'BTN_LEFT' and code == 'BTN_RIGHT'
@@ -906,12 +1187,15 @@ class KeyMon:
             self._handle_event(self.images['MOUSE'], code, value)
         #end if
 
-        if self.options.visible_click:
+        if self.hot_options.visible_click and self.pointer_overlays:
             if value == 1:
-                self.mouse_indicator_win.center_on_cursor()
-                self.mouse_indicator_win.maybe_show()
+                self.pointer_overlays.click()
+            #end if
+        elif self.hot_options.visible_click:
+            if value == 1:
+                self.mouse_indicators.press()
             else:
-                self.mouse_indicator_win.fade_away()
+                self.mouse_indicators.release()
             #end if
         #end if
         return True
@@ -944,7 +1228,7 @@ class KeyMon:
     def destroy(self, unused_widget, unused_data=None):
         """Also quit the program."""
         self.devices.stop_listening()
-        self.options.save()
+        self.save_options()
         Gtk.main_quit()
     #end destroy
 
@@ -1041,46 +1325,101 @@ class KeyMon:
         #end toggle_a_key
 
     #begin settings_changed
+        changed = self.options.changed_since(self.applied_options)
+        self.applied_options = self.options.values()
+        if not changed:
+            return
+        self.hot_options = self.options.snapshot(HOT_OPTIONS)
+        logging.debug('Changed options: %s', ', '.join(sorted(changed)))
+        relayout = False
         for img in self.IMAGES:
-            toggle_a_key(img)
+            if img.lower() in changed:
+                toggle_a_key(img)
+                relayout = True
+            #end if
         #end for
-        self.create_buttons()
-        self.layout_boxes()
-        self.mouse_indicator_win.hide()
-        self.mouse_indicator_win.timeout = self.options.visible_click_timeout
-        self.update_chrome()
-        self.name_fnames = self.create_names_to_fnames()
-        self.pixbufs.reset_all(self.name_fnames, self.options.scale)
-        for but in self.buttons:
-            if but.normal != 'KEY_EMPTY':
-                but.reset_image(self.enabled[but.normal.replace('_EMPTY', '')])
-            else:
-                but.reset_image()
+        if 'old_keys' in changed:
+            self.resize_key_history()
+            relayout = True
+        #end if
+        if changed & {'visible_click', 'visible_click_timeout', 'follow_mouse'}:
+            self.mouse_indicators.hide()
+            self.mouse_indicators.set_timeout(self.options.visible_click_timeout)
+            if self.pointer_overlays:
+                self.pointer_overlays.set_timeout(self.options.visible_click_timeout)
+                if not self.options.follow_mouse:
+                    self.pointer_overlays.hide_follower()
+                #end if
             #end if
-            if but.normal == 'MOUSE':
-                but.timeout_secs = self.options.mouse_timeout
-            else:
-                but.timeout_secs = self.options.key_timeout
+        #end if
+        if changed & {'decorated', 'backgroundless'}:
+            self.update_chrome()
+            relayout = True
+        #end if
+        if 'kbd_file' in changed:
+            # reload keymap
+            self.modmaps = mod_mapper.safely_read_group_mod_maps \
+              (
+                fname = self.options.kbd_file,
+                kbd_files = self.options.kbd_files,
+                display = self.devices.local_display,
+                cache_dir = settings.get_cache_dir()
+              )
+        #end if
+        render_changed = self.render_config != self.get_render_config()
+        if render_changed:
+            self.render_config = self.get_render_config()
+            self.load_theme()
+            self.watch_theme()
+        #end if
+        if render_changed or 'kbd_file' in changed:
+            # Images rendered for earlier configurations are kept by
+            # self.pixbufs, so switching back to one is cheap.  The key
+            # images of the previous keyboard map are dropped from
+            # name_fnames, they would be taken for images of the theme.
+            # The shape masks are not kept: images of the same name and
+            # size look different in another theme or keyboard map.
+            self.shape_mask_cache.clear()
+            self.shape_mask_current = None
+            self.name_fnames = self.create_names_to_fnames()
+            self.build_key_tables()
+            self.pixbufs.reset_all(self.name_fnames, self.options.scale, self.theme_dir)
+            for but in self.buttons:
+                if but.normal != 'KEY_EMPTY':
+                    but.reset_image(self.enabled[but.normal.replace('_EMPTY', '')])
+                else:
+                    but.reset_image()
+                #end if
+            #end for
+        #end if
+        if render_changed:
+            if self.canvas:
+                self.canvas.reset_layout()
             #end if
-        #end for
-
-        # all this to get it to resize smaller
-        x, y = self.window.get_position()
-        self.hbox.resize_children()
-        self.window.resize_children()
-        self.window.reshow_with_initial_size()
-        self.hbox.resize_children()
-        self.event_box.resize_children()
-        self.window.resize_children()
-        self.window.move(x, y)
-        self.update_shape_mask(force=True)
+            relayout = True
+        #end if
+        if changed & {'mouse_timeout', 'key_timeout'}:
+            for but in self.buttons:
+                if but.normal == 'MOUSE':
+                    but.timeout_secs = self.options.mouse_timeout
+                else:
+                    but.timeout_secs = self.options.key_timeout
+                #end if
+            #end for
+        #end if
 
-        # reload keymap
-        self.modmap = mod_mapper.safely_read_mod_map \
-          (
-            fname = self.options.kbd_file,
-            kbd_files = self.options.kbd_files
-          )
+        if relayout:
+            # all this to get it to resize smaller
+            x, y = self.window.get_position()
+            self.hbox.resize_children()
+            self.window.resize_children()
+            self.window.reshow_with_initial_size()
+            self.hbox.resize_children()
+            self.event_box.resize_children()
+            self.window.resize_children()
+            self.window.move(x, y)
+            self.update_shape_mask(force=True)
+        #end if
     #end settings_changed
 
     def show_about_dlg(self, *_):
@@ -1244,6 +1583,16 @@ def create_options():
         ini_name='mouse_timeout',
         help=_('Timeout before mouse returns to unpressed image. Defaults to %default')
       )
+    opts.add_option \
+      (
+        opt_long='--canvas',
+        dest='canvas',
+        type='bool',
+        ini_group='ui',
+        ini_name='canvas',
+        default=False,
+        help=_('Paint all buttons on a single widget (takes effect on restart)')
+      )
     opts.add_option \
       (
         opt_long='--visible-click-timeout',
@@ -1328,6 +1677,16 @@ def create_options():
         default=False,
         help=_('Show the mouse more visibly')
       )
+    opts.add_option \
+      (
+        opt_long='--pointer-overlay',
+        dest='pointer_overlay',
+        type='bool',
+        ini_group='ui',
+        ini_name='pointer-overlay',
+        default=False,
+        help=_('Draw visible clicks and the mouse follower on an overlay (takes effect on restart)')
+      )
     opts.add_option \
       (
         opt_long='--kbdfile',
@@ -1520,7 +1879,7 @@ def main():
         opts.scale = 1.25
     #end if
 
-    opts.themes = settings.get_themes()
+    opts.themes = settings.get_themes(refresh = opts.list_themes)
     if opts.list_themes:
         print(_('Available themes:'))
         print()
@@ -0,0 +1,230 @@
+#!/usr/bin/python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""What to do with each scan code, worked out before any key is pressed.
+
+The keyboard map, the scale and the named images only change with the
+settings, so the label, kind and image of every key at every shift
+level are resolved into one list indexed by scan code.  Handling a key
+event is then a single index operation.
+
+Usage: python3 -m keymon.key_table [kbd-file]
+  times the lookup of every key of the kbd file against classify().
+"""
+
+import collections
+import logging
+
+MODIFIER_KEYSYMS = \
+    (
+        # keysym prefix, image
+        ('KEY_SHIFT', 'SHIFT'),
+        ('KEY_CONTROL', 'CTRL'),
+        ('KEY_ALT', 'ALT'),
+        ('KEY_ISO_LEVEL3_SHIFT', 'ALT'),
+        ('KEY_SUPER', 'META'),
+    )
+
+KEY = 'key'
+  # shown in the key history
+MODIFIER = 'modifier'
+  # shown in the image of a modifier
+IGNORED = 'ignored'
+  # in the keyboard map but not shown
+
+KeyInfo = collections.namedtuple('KeyInfo', ('code', 'label', 'category', 'image', 'name', 'template'))
+  # code: key name from the keyboard map, label: text for the current scale,
+  # image: KeyMon.images entry or 'KEY' for the key history,
+  # name: what the image switches to, template: to draw name with,
+  # None if it is already in name_fnames.
+
+def key_template(code, letter):
+    """Return the name of the template used to draw the key code with the
+    label letter, or None if code is not drawn from a template."""
+    if code.startswith('KEY_KP'):
+        return 'one-char-numpad-template'
+    elif code.startswith('KEY_'):
+        if len(letter) == 1:
+            return 'one-char-template'
+        #end if
+        return 'multi-char-template'
+    #end if
+    return None
+#end key_template
+
+def classify(vals, scale, named):
+    """Return the KeyInfo for the keyboard map entry vals, a
+    (code, medium name, short name) tuple, named being the images that
+    do not need a template."""
+    code, medium_name, short_name = vals
+    if scale < 1.0 and short_name:
+        medium_name = short_name
+    #end if
+    if code in named:
+        return KeyInfo(code, medium_name, KEY, 'KEY', code, None)
+    #end if
+    for keysym, img in MODIFIER_KEYSYMS:
+        if code.startswith(keysym):
+            if keysym == 'KEY_ISO_LEVEL3_SHIFT':
+                return KeyInfo(code, medium_name, MODIFIER, img, 'ALTGR', None)
+            #end if
+            return KeyInfo(code, medium_name, MODIFIER, img, img, None)
+        #end if
+    #end for
+    template = key_template(code, medium_name)
+    if template:
+        return KeyInfo(code, medium_name, KEY, 'KEY', code, template)
+    #end if
+    return KeyInfo(code, medium_name, IGNORED, None, None, None)
+#end classify
+
+LEVELS = 4
+  # shift levels: none, Shift, AltGr, Shift+AltGr
+
+def level_infos(info, labels):
+    """Return the KeyInfo of each shift level of the key with the KeyInfo
+    info at the first level, given the labels of the other levels from
+    the keyboard map.  Keys without a label of their own at a level are
+    shown as at the first level."""
+    ret = [info]
+    for level in range(1, LEVELS):
+        label = labels[level - 1] if level - 1 < len(labels) else ''
+        if info.template and label and label != info.label:
+            ret.append \
+              (
+                info._replace
+                  (
+                    label = label,
+                    name = '%s_LEVEL%d' % (info.name, level + 1),
+                    template = key_template(info.code, label)
+                  )
+              )
+        else:
+            ret.append(info)
+        #end if
+    #end for
+    return tuple(ret)
+#end level_infos
+
+def key_images(infos):
+    """Return a dict of image name to the (template, label) it is drawn
+    with, for the KeyInfos of infos drawn from a template."""
+    return dict((info.name, (info.template, info.label)) for info in infos if info.template)
+#end key_images
+
+class KeyTable:
+    """The KeyInfo of every scan code of a keyboard map, at every shift
+    level."""
+
+    def __init__(self, modmap, scale, named, group=0):
+        """Args:
+          modmap: a mod_mapper.ModMapper.
+          scale: the scale of the window, below 1.0 the short names are used.
+          named: the images that exist without a template.
+          group: the XKB group of modmap, from 0.  The images of the keys
+            drawn from a template are named after it, as the same key may
+            have other labels in the other groups.
+        """
+        self.scale = scale
+        self.named = named
+        self.group = group
+        size = max(modmap.map, default = -1) + 1
+        self.table = [None] * size
+        self.by_name = {}
+          # for events whose scan code does not match the keyboard map
+        for scancode, vals in modmap.map.items():
+            if vals[0]:
+                infos = self._key_infos(vals, modmap.levels.get(scancode, ()))
+                self.table[scancode] = infos
+                self.by_name[vals[0]] = infos
+            #end if
+        #end for
+    #end __init__
+
+    def _key_infos(self, vals, labels):
+        # the KeyInfo of each level of the key with the keyboard map entry vals.
+        info = classify(vals, self.scale, self.named)
+        if info.template and self.group:
+            info = info._replace(name = '%s_GROUP%d' % (info.code, self.group + 1))
+        #end if
+        return level_infos(info, labels)
+    #end _key_infos
+
+    def lookup(self, scancode, name, level=0):
+        """Return the KeyInfo for the key event at the shift level (from 0),
+        or None if the key is not in the keyboard map."""
+        if 0 <= scancode < len(self.table):
+            infos = self.table[scancode]
+            if infos is not None and infos[0].code == name:
+                return infos[level]
+            #end if
+        #end if
+        infos = self.by_name.get(name)
+        if infos is None:
+            return None
+        logging.info('Found key via alt lookup %s', name)
+        return infos[level]
+    #end lookup
+
+    def add_key(self, code, label):
+        """Add the key named code, missing from the keyboard map, with
+        this label.  Returns its KeyInfo at every level."""
+        infos = self._key_infos((code, label, ''), ())
+        self.by_name[code] = infos
+        return infos
+    #end add_key
+
+    def infos(self):
+        """Yield the KeyInfo of every key at every level."""
+        for infos in self.by_name.values():
+            yield from infos
+        #end for
+    #end infos
+
+#end KeyTable
+
+def _run_benchmark():
+    """Compare the table lookup to classifying every event."""
+    import sys
+    import timeit
+    from keymon import mod_mapper
+    fname = sys.argv[1] if len(sys.argv) > 1 else 'us.kbd'
+    modmap = mod_mapper.read_kdb(fname)
+    named = {'KEY_SPACE', 'KEY_TAB', 'KEY_BACKSPACE', 'KEY_RETURN', 'KEY_CAPSLOCK'}
+    table = KeyTable(modmap, 1.0, named)
+    events = [(scancode, vals[0]) for scancode, vals in modmap.map.items()]
+
+    def by_classify():
+        for scancode, name in events:
+            classify(modmap.get_and_check(scancode, name), 1.0, named)
+        #end for
+    #end by_classify
+
+    def by_table():
+        for scancode, name in events:
+            table.lookup(scancode, name)
+        #end for
+    #end by_table
+
+    for title, func in (('classify', by_classify), ('table', by_table)):
+        secs = min(timeit.repeat(func, number = 1000, repeat = 5))
+        print('%-8s %.3f us per key' % (title, secs * 1000000 / 1000 / len(events)))
+    #end for
+#end _run_benchmark
+
+if __name__ == '__main__':
+    _run_benchmark()
+#end if
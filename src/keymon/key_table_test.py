@@ -0,0 +1,116 @@
+#!/usr/bin/python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import key_table
+import mod_mapper
+
+class TestKeyTable(unittest.TestCase):
+
+    def setUp(self):
+        self.modmap = mod_mapper.ModMapper.from_map \
+          (
+            {
+                30: ('KEY_A', 'a', ''),
+                42: ('KEY_SHIFT_L', 'Shift', 'Shft'),
+                57: ('KEY_SPACE', 'Space', 'Spc'),
+                79: ('KEY_KP1', '1', ''),
+                92: ('KEY_ISO_LEVEL3_SHIFT', 'AltGr', 'AGr'),
+                93: ('KEY_PAGE_UP', 'PgUp', 'PgU'),
+            }
+          )
+        self.table = key_table.KeyTable(self.modmap, 1.0, {'KEY_SPACE'})
+    #end setUp
+
+    def test_categories(self):
+        info = self.table.lookup(30, 'KEY_A')
+        self.assertEqual((info.category, info.name, info.template), ('key', 'KEY_A', 'one-char-template'))
+        info = self.table.lookup(57, 'KEY_SPACE')
+        self.assertEqual((info.category, info.template), ('key', None))
+        self.assertEqual(self.table.lookup(79, 'KEY_KP1').template, 'one-char-numpad-template')
+        self.assertEqual(self.table.lookup(93, 'KEY_PAGE_UP').template, 'multi-char-template')
+        info = self.table.lookup(42, 'KEY_SHIFT_L')
+        self.assertEqual((info.category, info.image, info.name), ('modifier', 'SHIFT', 'SHIFT'))
+        info = self.table.lookup(92, 'KEY_ISO_LEVEL3_SHIFT')
+        self.assertEqual((info.image, info.name), ('ALT', 'ALTGR'))
+    #end test_categories
+
+    def test_same_as_classify(self):
+        for scancode, vals in self.modmap.map.items():
+            self.assertEqual \
+              (
+                self.table.lookup(scancode, vals[0]),
+                key_table.classify(self.modmap.get_and_check(scancode, vals[0]), 1.0, {'KEY_SPACE'})
+              )
+        #end for
+    #end test_same_as_classify
+
+    def test_short_labels(self):
+        table = key_table.KeyTable(self.modmap, 0.8, ())
+        self.assertEqual(table.lookup(93, 'KEY_PAGE_UP').label, 'PgU')
+        self.assertEqual(table.lookup(30, 'KEY_A').label, 'a')
+    #end test_short_labels
+
+    def test_alt_lookup(self):
+        self.assertEqual(self.table.lookup(31, 'KEY_A').code, 'KEY_A')
+        self.assertEqual(self.table.lookup(1000, 'KEY_A').code, 'KEY_A')
+        self.assertIsNone(self.table.lookup(30, 'KEY_B'))
+    #end test_alt_lookup
+
+    def test_levels(self):
+        self.modmap.levels = {30: ('a', '\u00e6', ''), 79: ('', '', ''), 93: ('End', '', '')}
+        self.modmap.levels[2] = ('!',)
+        self.modmap.map[2] = ('KEY_1', '1', '')
+        table = key_table.KeyTable(self.modmap, 1.0, {'KEY_SPACE'})
+        self.assertEqual(table.lookup(2, 'KEY_1', 1).name, 'KEY_1_LEVEL2')
+        self.assertEqual(table.lookup(2, 'KEY_1', 1).label, '!')
+        self.assertEqual(table.lookup(2, 'KEY_1', 3).name, 'KEY_1')
+        # same label as the first level
+        self.assertEqual(table.lookup(30, 'KEY_A', 1).name, 'KEY_A')
+        self.assertEqual(table.lookup(30, 'KEY_A', 2).name, 'KEY_A_LEVEL3')
+        self.assertEqual(table.lookup(93, 'KEY_PAGE_UP', 1).template, 'multi-char-template')
+        # only keys drawn from a template
+        self.assertEqual(table.lookup(42, 'KEY_SHIFT_L', 1).name, 'SHIFT')
+    #end test_levels
+
+    def test_groups(self):
+        self.modmap.levels = {30: ('A', '', '')}
+        table = key_table.KeyTable(self.modmap, 1.0, {'KEY_SPACE'}, 1)
+        self.assertEqual(table.lookup(30, 'KEY_A').name, 'KEY_A_GROUP2')
+        self.assertEqual(table.lookup(30, 'KEY_A', 1).name, 'KEY_A_GROUP2_LEVEL2')
+        self.assertEqual(table.lookup(57, 'KEY_SPACE').name, 'KEY_SPACE')
+        self.assertEqual(table.add_key('KEY_U044F', '\u042f')[0].name, 'KEY_U044F_GROUP2')
+    #end test_groups
+
+    def test_switch_kbd_maps(self):
+        us = mod_mapper.ModMapper.from_map({3: ('KEY_2', '2', ''), 30: ('KEY_A', 'a', '')}, {3: ('@', '', '')})
+        de = mod_mapper.ModMapper.from_map({3: ('KEY_2', '2', ''), 30: ('KEY_A', 'a', '')}, {3: ('"', '', '')})
+        images = key_table.key_images(key_table.KeyTable(us, 1.0, {'KEY_SPACE'}).infos())
+        self.assertEqual(images['KEY_2_LEVEL2'], ('one-char-template', '@'))
+        changed = dict \
+          (
+            (name, drawn_with)
+            for name, drawn_with in key_table.key_images(key_table.KeyTable(de, 1.0, {'KEY_SPACE'}).infos()).items()
+            if images.get(name) != drawn_with
+          )
+        self.assertEqual(changed, {'KEY_2_LEVEL2': ('one-char-template', '"')})
+    #end test_switch_kbd_maps
+
+#end TestKeyTable
+
+if __name__ == '__main__':
+    unittest.main()
+#end if
@@ -0,0 +1,122 @@
+#!/usr/bin/python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""The character typed by an X keysym.
+
+Latin-1 keysyms are their own code point and keysyms from 0x1000000 on
+are 0x1000000 plus it.  The legacy ones in between (Cyrillic, Greek,
+Arabic, kana, ...) are looked up in keysyms.dat, generated from the
+comments of X11/keysymdef.h: two sorted arrays of 32-bit keysyms and
+code points, read on first use and searched with bisect.
+
+Usage: python3 -m keymon.keysym_unicode [/usr/include/X11/keysymdef.h]
+  writes keysyms.dat next to this file.
+"""
+
+import array
+import bisect
+import os
+import re
+import sys
+
+KEYSYMS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'keysyms.dat')
+UNICODE_KEYSYM = 0x01000000
+  # offset of the keysyms of any Unicode character
+
+_table = None
+  # (keysyms, code points), two array.array('I')
+
+def _load():
+    global _table
+    if _table is None:
+        keysyms = array.array('I')
+        codepoints = array.array('I')
+        try:
+            fin = open(KEYSYMS_FILE, 'rb')
+            data = fin.read()
+            fin.close()
+            half = len(data) // 2
+            keysyms.frombytes(data[:half])
+            codepoints.frombytes(data[half:])
+            if sys.byteorder != 'little':
+                keysyms.byteswap()
+                codepoints.byteswap()
+            #end if
+        except OSError:
+            pass
+        #end try
+        _table = (keysyms, codepoints)
+    #end if
+    return _table
+#end _load
+
+def to_unicode(keysym):
+    """Return the character of keysym, or '' if it has none."""
+    if 0x20 <= keysym < 0x7f or 0xa0 <= keysym <= 0xff:
+        return chr(keysym)
+    #end if
+    if UNICODE_KEYSYM <= keysym <= UNICODE_KEYSYM + sys.maxunicode:
+        return chr(keysym - UNICODE_KEYSYM)
+    #end if
+    keysyms, codepoints = _load()
+    i = bisect.bisect_left(keysyms, keysym)
+    if i < len(keysyms) and keysyms[i] == keysym:
+        return chr(codepoints[i])
+    #end if
+    return ''
+#end to_unicode
+
+def parse_keysymdef(text):
+    """Return the sorted (keysym, code point) pairs of the legacy keysyms
+    in the text of keysymdef.h."""
+    re_define = re.compile \
+      (
+        r'^#define XK_\w+\s+0x([0-9a-fA-F]+)\s*/\*\s*\(?U\+([0-9a-fA-F]+)',
+        re.MULTILINE
+      )
+    ret = {}
+    for grps in re_define.finditer(text):
+        keysym = int(grps.group(1), 16)
+        if 0xff < keysym < UNICODE_KEYSYM:
+            ret.setdefault(keysym, int(grps.group(2), 16))
+        #end if
+    #end for
+    return sorted(ret.items())
+#end parse_keysymdef
+
+def write_table(pairs, fname):
+    keysyms = array.array('I', (keysym for keysym, _ in pairs))
+    codepoints = array.array('I', (codepoint for _, codepoint in pairs))
+    if sys.byteorder != 'little':
+        keysyms.byteswap()
+        codepoints.byteswap()
+    #end if
+    fout = open(fname, 'wb')
+    fout.write(keysyms.tobytes())
+    fout.write(codepoints.tobytes())
+    fout.close()
+#end write_table
+
+def main():
+    header = sys.argv[1] if len(sys.argv) > 1 else '/usr/include/X11/keysymdef.h'
+    pairs = parse_keysymdef(open(header, encoding='latin-1').read())
+    write_table(pairs, KEYSYMS_FILE)
+    print('Output %r with %d keysyms' % (KEYSYMS_FILE, len(pairs)))
+#end main
+
+if __name__ == '__main__':
+    main()
+#end if
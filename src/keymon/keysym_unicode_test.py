@@ -0,0 +1,68 @@
+#!/usr/bin/python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+import unittest
+import keysym_unicode
+
+class TestKeysymUnicode(unittest.TestCase):
+
+    def test_direct(self):
+        self.assertEqual(keysym_unicode.to_unicode(0x41), 'A')
+        self.assertEqual(keysym_unicode.to_unicode(0xe9), 'é')
+        self.assertEqual(keysym_unicode.to_unicode(0x10004d8), 'Ә')
+    #end test_direct
+
+    def test_legacy(self):
+        self.assertEqual(keysym_unicode.to_unicode(0x6c6), 'ф')
+          # Cyrillic_ef
+        self.assertEqual(keysym_unicode.to_unicode(0x7e1), 'α')
+          # Greek_alpha
+        self.assertEqual(keysym_unicode.to_unicode(0xff0d), '')
+          # Return
+        self.assertEqual(keysym_unicode.to_unicode(0x1008ff13), '')
+          # XF86AudioRaiseVolume
+    #end test_legacy
+
+    def test_parse_keysymdef(self):
+        text = \
+            (
+                '#define XK_space        0x0020  /* U+0020 SPACE */\n'
+                '#define XK_Greek_alpha  0x07e1  /* U+03B1 GREEK SMALL LETTER ALPHA */\n'
+                '#define XK_Cyrillic_ef  0x06c6  /* U+0444 CYRILLIC SMALL LETTER EF */\n'
+                '#define XK_topleftradical 0x08a2  /*(U+250C BOX DRAWINGS LIGHT DOWN AND RIGHT)*/\n'
+                '#define XK_Return       0xff0d  /* Return, enter */\n'
+                '#define XK_Farsi_0    0x10006f0  /* U+06F0 EXTENDED ARABIC-INDIC DIGIT ZERO */\n'
+            )
+        pairs = keysym_unicode.parse_keysymdef(text)
+        self.assertEqual(pairs, [(0x6c6, 0x444), (0x7e1, 0x3b1), (0x8a2, 0x250c)])
+        tmpdir = tempfile.mkdtemp()
+        try:
+            fname = os.path.join(tmpdir, 'keysyms.dat')
+            keysym_unicode.write_table(pairs, fname)
+            self.assertEqual(os.path.getsize(fname), 3 * 8)
+        finally:
+            shutil.rmtree(tmpdir)
+        #end try
+    #end test_parse_keysymdef
+
+#end TestKeysymUnicode
+
+if __name__ == '__main__':
+    unittest.main()
+#end if
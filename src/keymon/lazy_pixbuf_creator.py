@@ -14,12 +14,21 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-"""Create pixbuf on demand.
+"""Create images on demand.
 
-This creates a GTK pixbuf in one of 2 manners:
+This creates a cairo image surface in one of 3 manners:
 1) Simple filename (probably supports most image formats)
 2) A function which returns bytes to a file which can be read by
    pixbuf_new_from_file().
+3) A KeyLabel, a key template whose blank key cap is rendered only once
+   and the label drawn on top of it with Pango.
+
+If the theme comes with a sprite atlas for the current scale (see atlas.py)
+images found in it are taken from there instead of being rendered at all.
+
+Images are rendered at the scale times the device scale factor of the
+monitor, and carry that device scale so GTK draws them at their logical
+size without blurring them on HiDPI screens.
 
 The name_fnames contains a list for key.  Each element of the list will be
 composited with the previous element (overlayed on top of).
@@ -29,47 +38,421 @@ Alpha transparencies from the new, overlayed, image are respected.
 
 __author__ = 'scott@forusers.com (Scott Kirkwood))'
 
+import collections
+import hashlib
 import logging
 import os
+import re
 import sys
+import xml.etree.ElementTree as ET
 import cairo
 import gi
 gi.require_version("Gdk", "3.0")
+gi.require_version("Pango", "1.0")
+gi.require_version("PangoCairo", "1.0")
 gi.require_version("Rsvg", "2.0")
 from gi.repository import \
     Gdk, \
-    GdkPixbuf, \
+    Pango, \
+    PangoCairo, \
     Rsvg
 
+PLACEHOLDER = '&'
+  # text of the template element that gets replaced by the key label
+
+LabelStyle = collections.namedtuple \
+  (
+    'LabelStyle',
+    ['x', 'y', 'anchor', 'font', 'rgba'],
+  )
+
+class KeyLabel:
+    """A key template with its placeholder replaced by label."""
+
+    def __init__(self, fname, label):
+        self.fname = fname
+        self.label = label
+    #end __init__
+
+    def __repr__(self):
+        return 'KeyLabel(%r, %r)' % (self.fname, self.label)
+    #end __repr__
+
+#end KeyLabel
+
+def _parse_style(style):
+    """Convert an SVG style attribute into a dict."""
+    ret = {}
+    for item in (style or '').split(';'):
+        if ':' in item:
+            key, value = item.split(':', 1)
+            ret[key.strip()] = value.strip()
+        #end if
+    #end for
+    return ret
+#end _parse_style
+
+def _parse_color(color, opacity):
+    """Convert an SVG colour and opacity into an rgba tuple, or None."""
+    if not color.startswith('#'):
+        return None
+    color = color[1:]
+    if len(color) == 3:
+        color = ''.join(c + c for c in color)
+    #end if
+    if len(color) != 6:
+        return None
+    return tuple(int(color[i:i + 2], 16) / 255 for i in (0, 2, 4)) + (opacity,)
+#end _parse_color
+
+def read_label_style(fname):
+    """Find where and how a template draws its placeholder text.
+    Returns:
+      A LabelStyle, or None if the template can't be handled that way (in
+      which case the whole SVG has to be rendered with the label in it).
+    """
+    try:
+        root = ET.parse(fname).getroot()
+    except (OSError, ET.ParseError) as exp:
+        logging.warning('Unable to read template %r: %s', fname, exp)
+        return None
+    #end try
+    parents = dict((child, parent) for parent in root.iter() for child in parent)
+    for elt in root.iter():
+        if elt.text != PLACEHOLDER:
+            continue
+        # Style properties cascade down from the enclosing elements, and
+        # any transform would move the text somewhere else entirely.
+        chain = []
+        node = elt
+        while node is not None:
+            if node.get('transform'):
+                return None
+            chain.insert(0, node)
+            node = parents.get(node)
+        #end while
+        style = {}
+        for node in chain:
+            style.update(_parse_style(node.get('style')))
+        #end for
+        pos_x = elt.get('x') or parents[elt].get('x')
+        pos_y = elt.get('y') or parents[elt].get('y')
+        size = re.match(r'[\d.]+', style.get('font-size', ''))
+        if pos_x is None or pos_y is None or not size:
+            return None
+        rgba = _parse_color \
+          (
+            style.get('fill', '#000000'),
+            float(style.get('fill-opacity', 1)) * float(style.get('opacity', 1))
+          )
+        if rgba is None:
+            return None
+        font = Pango.FontDescription()
+        font.set_family(style.get('font-family', 'Sans').split(',')[0].strip('\'"'))
+        if style.get('font-weight') in ('bold', 'bolder', '600', '700', '800', '900'):
+            font.set_weight(Pango.Weight.BOLD)
+        #end if
+        if style.get('font-style') in ('italic', 'oblique'):
+            font.set_style(Pango.Style.ITALIC)
+        #end if
+        font.set_absolute_size(float(size.group(0)) * Pango.SCALE)
+        return LabelStyle \
+          (
+            x = float(pos_x),
+            y = float(pos_y),
+            anchor = style.get('text-anchor', 'start'),
+            font = font,
+            rgba = rgba
+          )
+    #end for
+    return None
+#end read_label_style
+
+def op_fname(operation):
+    """Return the file an image operation is drawn from, or None."""
+    if isinstance(operation, KeyLabel):
+        return operation.fname
+    elif isinstance(operation, str):
+        return operation
+    #end if
+    return getattr(operation, 'signature', (None, None))[0]
+#end op_fname
+
+def op_signature(operation, dirname):
+    """Return a string describing an image operation which is stable across
+    runs, or None if the operation isn't a file in directory dirname."""
+    if isinstance(operation, KeyLabel):
+        fname, suffix = operation.fname, ':' + operation.label
+    elif isinstance(operation, str):
+        fname, suffix = operation, ''
+    else:
+        fname, suffix = getattr(operation, 'signature', (None, None))
+    #end if
+    if fname is None or os.path.dirname(fname) != dirname:
+        return None
+    return os.path.basename(fname) + suffix
+#end op_signature
+
+def ops_signature(ops, dirname):
+    """Return the signature of a list of image operations, or None."""
+    sigs = [op_signature(operation, dirname) for operation in ops]
+    if None in sigs:
+        return None
+    return '+'.join(sigs)
+#end ops_signature
+
+def source_digest(fname):
+    """Return the hash of the contents of the file fname as stored in the
+    index of an atlas, or None if it can't be read."""
+    try:
+        fin = open(fname, 'rb')
+        digest = hashlib.sha1(fin.read()).hexdigest()
+        fin.close()
+    except OSError:
+        return None
+    #end try
+    return digest
+#end source_digest
+
+def atlas_fname(theme_dir, scale):
+    """Return the name of the atlas image for this theme and scale, the
+    index lives next to it with an extra .idx extension."""
+    return os.path.join(theme_dir, 'atlas-%g.png' % scale)
+#end atlas_fname
+
+class Atlas:
+    """Images pre-rendered into a single image, all for one theme and scale."""
+
+    def __init__(self, fname, index):
+        self.fname = fname
+        self.index = index
+        self.surface = None
+    #end __init__
+
+    @classmethod
+    def load(cls, theme_dir, scale):
+        """Return the atlas for this theme and scale, or None if there is none
+        or if one of the files it was rendered from changed since."""
+        fname = atlas_fname(theme_dir, scale)
+        index = {}
+        sources = {}
+          # basename to the hash of its contents when the atlas was built
+        try:
+            for line in open(fname + '.idx', 'r', encoding='utf-8'):
+                if line.startswith('#'):
+                    fields = line.rstrip('\n').split(' ', 3)
+                    if len(fields) == 4 and fields[1] == 'source':
+                        sources[fields[3]] = fields[2]
+                    #end if
+                    continue
+                #end if
+                fields = line.rstrip('\n').split(' ', 4)
+                if len(fields) == 5:
+                    index[fields[4]] = tuple(int(f) for f in fields[:4])
+                #end if
+            #end for
+        except OSError:
+            return None
+        #end try
+        if not sources:
+            logging.info('Ignoring atlas %r without sources, build it again', fname)
+            return None
+        #end if
+        for basename, digest in sources.items():
+            if source_digest(os.path.join(theme_dir, basename)) != digest:
+                logging.info('Ignoring atlas %r, %r changed', fname, basename)
+                return None
+            #end if
+        #end for
+        logging.debug('Using atlas %r with %d images', fname, len(index))
+        return cls(fname, index)
+    #end load
+
+    def get(self, signature, device_scale=1):
+        """Return the image with this signature, or None if not in the atlas."""
+        if signature not in self.index:
+            return None
+        if self.surface is None:
+            self.surface = cairo.ImageSurface.create_from_png(self.fname)
+        #end if
+        # shares the pixels of the atlas, no copy is made.
+        img = self.surface.create_for_rectangle(*self.index[signature])
+        img.set_device_scale(device_scale, device_scale)
+        return img
+    #end get
+
+#end Atlas
+
+def _mtime(fname):
+    try:
+        return os.stat(fname).st_mtime_ns
+    except OSError:
+        return None
+    #end try
+#end _mtime
+
+def op_key(operation):
+    """Return a hashable key identifying everything the result of an image
+    operation depends on, or None if that can't be known."""
+    if isinstance(operation, KeyLabel):
+        return ('label', operation.fname, _mtime(operation.fname), operation.label)
+    elif isinstance(operation, str):
+        return ('file', operation, _mtime(operation))
+    #end if
+    fname, suffix = getattr(operation, 'signature', (None, None))
+    if fname is None:
+        return None
+    return ('svg', fname, _mtime(fname), suffix)
+#end op_key
+
+def image_size(img):
+    """Return the size of an image from LazyPixbufCreator in logical pixels.
+    Works for atlas sub-surfaces as well, which have no get_width()."""
+    x1, y1, x2, y2 = cairo.Context(img).clip_extents()
+    return round(x2 - x1), round(y2 - y1)
+#end image_size
+
 class LazyPixbufCreator:
-    """Class to create SVG images on the fly."""
+    """Class to create SVG images on the fly.
+
+    Rendered images are kept per theme and scale, across calls to
+    reset_all(), so going back to an earlier configuration re-uses them.
+    An image is only rendered again when one of its inputs changed, and
+    images rendered from identical bytes share a single surface.
+    The same goes for the region of the opaque pixels of each image, used
+    for shaping windows.
+    """
 
-    def __init__(self, name_fnames, resize):
+    def __init__(self, name_fnames, resize, theme_dir=None, device_scale=1):
         """Initialize with empty.
 
         Args:
           name_fnames: List of names to filename list.
+          resize: scale to render the images at.
+          theme_dir: directory of the theme, to look for a sprite atlas.
+          device_scale: scale factor of the monitor the images are shown on.
         """
-        self.pixbufs = {}
-        self.resize = resize
-        self.name_fnames = name_fnames
+        self.caches = {}
+          # (theme_dir, resize, device_scale) to dict of op keys to rendered image.
+        self.region_caches = {}
+          # same for the regions of the rendered images.
+        self.atlases = {}
+          # (theme_dir, resize, device_scale) to Atlas or None.
+        self.by_content = {}
+          # hash of the rendered bytes, scale and device scale to rendered
+          # image, shared by images with identical sources.
+        self.file_digests = {}
+          # (filename, mtime) to hash of its contents
+        self.key_caps = {}
+        self.label_layouts = {}
+        self.device_scale = device_scale
+        self.reset_all(name_fnames, resize, theme_dir)
     #end __init__
 
-    def reset_all(self, names_fnames, resize):
+    def reset_all(self, names_fnames, resize, theme_dir=None):
         """Resets the name to filenames and size."""
         self.pixbufs = {}
+        self.regions = {}
+        self.name_keys = {}
         self.name_fnames = names_fnames
         self.resize = resize
+        self.theme_dir = theme_dir
+        self._select_cache()
     #end reset_all
 
+    def set_device_scale(self, device_scale):
+        """Render for a monitor with this scale factor from now on.
+        Returns:
+          True iff the images have to be fetched again.
+        """
+        if device_scale == self.device_scale:
+            return False
+        self.device_scale = device_scale
+        self.pixbufs = {}
+        self.regions = {}
+        self._select_cache()
+        return True
+    #end set_device_scale
+
+    def _select_cache(self):
+        config = (self.theme_dir, self.resize, self.device_scale)
+        self.rendered = self.caches.setdefault(config, {})
+        self.rendered_regions = self.region_caches.setdefault(config, {})
+        if config not in self.atlases:
+            if self.theme_dir:
+                self.atlases[config] = Atlas.load(self.theme_dir, self.resize * self.device_scale)
+            else:
+                self.atlases[config] = None
+            #end if
+        #end if
+        self.atlas = self.atlases[config]
+    #end _select_cache
+
+    def forget(self, name):
+        """Drop the image name, its operations in name_fnames changed."""
+        self.pixbufs.pop(name, None)
+        self.regions.pop(name, None)
+        self.name_keys.pop(name, None)
+    #end forget
+
+    def invalidate_file(self, fname):
+        """The file fname was changed, drop everything drawn from it.  The
+        images are rendered again from the new file when next fetched.
+        Returns:
+          the set of the names of the images drawn from it.
+        """
+        names = set \
+          (
+            name
+            for name, ops in self.name_fnames.items()
+            if any(op_fname(operation) == fname for operation in ops)
+          )
+        for name in names:
+            self.forget(name)
+        #end for
+        # the other caches are keyed by mtime, just drop what can't be used again.
+        for key in [key for key in self.key_caps if key[0] == fname]:
+            del self.key_caps[key]
+        #end for
+        self.label_layouts.pop(fname, None)
+        dirname = os.path.dirname(fname)
+        for config, atlas in self.atlases.items():
+            if atlas is not None and config[0] == dirname:
+                # holds the images as they were before.
+                logging.debug('Not using atlas %r any more', atlas.fname)
+                self.atlases[config] = None
+            #end if
+        #end for
+        self._select_cache()
+        return names
+    #end invalidate_file
+
     def get(self, name):
-        """Get the pixbuf with this name."""
+        """Get the image surface with this name."""
         if name not in self.pixbufs:
             name = self.create_pixbuf(name)
         #end if
         return self.pixbufs[name]
     #end get
 
+    def get_region(self, name):
+        """Get the region of the opaque pixels of the image with this name,
+        in logical pixels."""
+        if name not in self.regions:
+            img = self.get(name)
+            key = self.name_keys.get(name)
+            region = self.rendered_regions.get(key)
+            if region is None:
+                region = Gdk.cairo_region_create_from_surface(img)
+                if key is not None:
+                    self.rendered_regions[key] = region
+                #end if
+            #end if
+            self.regions[name] = region
+        #end if
+        return self.regions[name]
+    #end get_region
+
     def create_pixbuf(self, name):
         """Creates the image.
         Args:
@@ -82,31 +465,161 @@ class LazyPixbufCreator:
             return 'KEY_EMPTY'
         #end if
         ops = self.name_fnames[name]
+        key = tuple(op_key(operation) for operation in ops)
+        if None in key:
+            key = None
+        #end if
+        self.name_keys[name] = key
+        if key in self.rendered:
+            self.pixbufs[name] = self.rendered[key]
+            return name
+        #end if
+        if self.atlas:
+            img = self.atlas.get(ops_signature(ops, self.theme_dir), self.device_scale)
+            if img:
+                return self._store(name, key, img)
+            #end if
+        #end if
+        content_key, datas = self._content_key(ops)
+        if content_key in self.by_content:
+            # same bytes as another image, maybe of another theme.
+            return self._store(name, key, self.by_content[content_key])
+        #end if
         img = None
-        for operation in ops:
-            if isinstance(operation, str):
-                fig = Rsvg.Handle.new_from_file(operation)
+        for operation, data in zip(ops, datas):
+            if isinstance(operation, KeyLabel):
+                pix = self._render_label(operation)
+            elif isinstance(operation, str):
+                pix = self._render_svg(Rsvg.Handle.new_from_file(operation))
             else:
-                fig = Rsvg.Handle.new_from_data(operation())
+                pix = self._render_svg(Rsvg.Handle.new_from_data(data))
             #end if
-            dims = fig.get_dimensions()
-            width = round(dims.width * self.resize)
-            height = round(dims.height * self.resize)
-            pix = cairo.ImageSurface(cairo.Format.ARGB32, width, height)
-            gc = cairo.Context(pix)
-            gc.identity_matrix()
-            gc.scale(self.resize, self.resize)
-            gc.set_source_rgba(0, 0, 0, 0)
-            gc.paint()
-            fig.render_cairo(gc)
-            pix.flush()
-            gc = None
-            img2 = Gdk.pixbuf_get_from_surface(pix, 0, 0, width, height)
-            img = self._composite(img, img2)
+            img = self._composite(img, pix)
         #end for
+        img.set_device_scale(self.device_scale, self.device_scale)
+        self.by_content[content_key] = img
+        return self._store(name, key, img)
+    #end create_pixbuf
+
+    def _store(self, name, key, img):
+        """Remember img as the image for name and for its op key."""
         self.pixbufs[name] = img
+        if key is not None:
+            self.rendered[key] = img
+        #end if
         return name
-    #end create_pixbuf
+    #end _store
+
+    def _file_digest(self, fname):
+        """Hash of the contents of a file, read again only when it changed."""
+        file_key = (fname, _mtime(fname))
+        if file_key not in self.file_digests:
+            self.file_digests[file_key] = hashlib.sha1(open(fname, 'rb').read()).digest()
+        #end if
+        return self.file_digests[file_key]
+    #end _file_digest
+
+    def _content_key(self, ops):
+        """Hash what the image of ops is rendered from, whatever its name.
+        Returns:
+          the hash, and the SVG data of each operation which is a function,
+          so it is not called twice.
+        """
+        digest = hashlib.sha1(repr((self.resize, self.device_scale)).encode())
+        datas = []
+        for operation in ops:
+            data = None
+            if isinstance(operation, KeyLabel):
+                digest.update(b'label:' + self._file_digest(operation.fname))
+                digest.update(operation.label.encode())
+            elif isinstance(operation, str):
+                digest.update(b'svg:' + self._file_digest(operation))
+            else:
+                data = operation()
+                digest.update(b'svg:' + hashlib.sha1(data).digest())
+            #end if
+            digest.update(b'\0')
+            datas.append(data)
+        #end for
+        return digest.digest(), datas
+    #end _content_key
+
+    def _render_svg(self, fig):
+        """Rasterize an Rsvg handle at the current size into a new surface."""
+        scale = self.resize * self.device_scale
+        dims = fig.get_dimensions()
+        width = round(dims.width * scale)
+        height = round(dims.height * scale)
+        pix = cairo.ImageSurface(cairo.Format.ARGB32, width, height)
+        gc = cairo.Context(pix)
+        gc.identity_matrix()
+        gc.scale(scale, scale)
+        gc.set_source_rgba(0, 0, 0, 0)
+        gc.paint()
+        fig.render_cairo(gc)
+        pix.flush()
+        gc = None
+        return pix
+    #end _render_svg
+
+    def _render_label(self, operation):
+        """Draw the label of a KeyLabel onto a copy of its blank key cap."""
+        fname = operation.fname
+        cap_key = (fname, _mtime(fname), self.resize, self.device_scale)
+        if cap_key not in self.key_caps:
+            logging.debug('Read template %r', fname)
+            fbytes = open(fname, 'rb').read()
+            style = read_label_style(fname)
+            if style is not None:
+                cap = self._render_svg \
+                  (
+                    Rsvg.Handle.new_from_data(fbytes.replace(b'&amp;', b''))
+                  )
+            else:
+                cap = None
+            #end if
+            self.key_caps[cap_key] = (fbytes, style, cap)
+        #end if
+        fbytes, style, cap = self.key_caps[cap_key]
+        if style is None:
+            # Fall back to substituting the label into the SVG itself.
+            label = operation.label.replace('&', '&amp;').replace('<', '&lt;')
+            return self._render_svg \
+              (
+                Rsvg.Handle.new_from_data(fbytes.replace(b'&amp;', label.encode()))
+              )
+        #end if
+
+        pix = cairo.ImageSurface(cairo.Format.ARGB32, cap.get_width(), cap.get_height())
+        gc = cairo.Context(pix)
+        gc.set_source_surface(cap, 0, 0)
+        gc.paint()
+        if operation.label:
+            gc.scale(self.resize * self.device_scale, self.resize * self.device_scale)
+            layout = self.label_layouts.get(fname)
+            if layout is None:
+                layout = PangoCairo.create_layout(gc)
+                layout.set_font_description(style.font)
+                self.label_layouts[fname] = layout
+            else:
+                PangoCairo.update_layout(gc, layout)
+            #end if
+            layout.set_text(operation.label, -1)
+            width = layout.get_pixel_extents()[1].width
+            pos_x = style.x
+            if style.anchor == 'middle':
+                pos_x -= width / 2
+            elif style.anchor == 'end':
+                pos_x -= width
+            #end if
+            gc.move_to(pos_x, style.y - layout.get_baseline() / Pango.SCALE)
+            gc.set_source_rgba(*style.rgba)
+            PangoCairo.show_layout(gc, layout)
+        #end if
+        pix.flush()
+        gc = None
+        return pix
+    #end _render_label
 
     def _composite(self, img, img2):
         """Combine/layer img2 on top of img.
@@ -117,20 +630,11 @@ class LazyPixbufCreator:
           updated image.
         """
         if img:
-            img2.composite \
-              (
-                dest = img,
-                dest_x = 0,
-                dest_y = 0,
-                dest_width = img.props.width,
-                dest_height = img.props.height,
-                offset_x = 0,
-                offset_y = 0,
-                scale_x = 1.0,
-                scale_y = 1.0,
-                interp_type = GdkPixbuf.InterpType.HYPER,
-                overall_alpha = 255
-              )
+            gc = cairo.Context(img)
+            gc.set_source_surface(img2, 0, 0)
+            gc.paint()
+            gc = None
+            img.flush()
             return img
         #end if
         return img2
@@ -14,15 +14,21 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-"""Run mod map and convert to something I can use."""
+"""Read the keyboard map and convert to something I can use.
+
+The map comes either from a .kbd file or from the X server, read over an
+Xlib connection.
+"""
 
 __author__ = 'scott@forusers.com (scottkirkwood)'
 
 import codecs
 import logging
+import marshal
 import os
 import re
-import subprocess
+
+from keymon import keysym_unicode
 
 MEDIUM_NAME = \
     {
@@ -210,10 +216,26 @@ class ModMapper:
 
     def __init__(self):
         self.map = {}
+        self.levels = {}
+          # scancode to the labels of the shift levels after the first, ''
+          # where the key has none.
         self.alt_map = {}
         self.name_to_code = {}
     #end __init__
 
+    @classmethod
+    def from_map(cls, codes, levels=None):
+        """Create from a dict of scancode to (key, medium name, short name),
+        and one of scancode to labels of the other shift levels."""
+        ret = cls()
+        ret.map = dict(codes)
+        if levels:
+            ret.levels = dict(levels)
+        #end if
+        ret.done()
+        return ret
+    #end from_map
+
     def done(self):
         """done setup, now create alt_map and name_to_code."""
         for key in self.map:
@@ -306,31 +328,119 @@ def parse_modmap(lines):
     return ret
 #end parse_modmap
 
-def read_kdb(fname):
-    """Read the kdb file."""
-    logging.debug('Loading kbd file: %s' % fname)
-    return \
-        parse_kdb \
-          (
-            codecs.open(os.path.join(os.path.dirname(os.path.abspath(__file__)), fname), 'r', 'utf-8')
-                .read()
-          )
+KBD_CACHE = 'kbd-cache.marshal'
+KBD_CACHE_VERSION = 2
+
+_kbd_caches = {}
+  # cache filename to dict of kbd filename to ((mtime, size), map, levels)
+
+def _load_kbd_cache(cache_fname):
+    """Return the parsed kbd files in cache_fname, read only once."""
+    if cache_fname not in _kbd_caches:
+        layouts = {}
+        try:
+            fin = open(cache_fname, 'rb')
+            data = marshal.load(fin)
+            fin.close()
+            if isinstance(data, dict) and data.get('version') == KBD_CACHE_VERSION:
+                layouts = data['layouts']
+            #end if
+        except FileNotFoundError:
+            pass
+        except (OSError, EOFError, ValueError, TypeError, KeyError) as err:
+            logging.warning('Ignoring kbd cache %r: %s' % (cache_fname, err))
+        #end try
+        _kbd_caches[cache_fname] = layouts
+    #end if
+    return _kbd_caches[cache_fname]
+#end _load_kbd_cache
+
+def _save_kbd_cache(cache_fname, layouts):
+    try:
+        os.makedirs(os.path.dirname(cache_fname), exist_ok=True)
+        temp_fname = cache_fname + '.tmp'
+        fout = open(temp_fname, 'wb')
+        marshal.dump({'version' : KBD_CACHE_VERSION, 'layouts' : layouts}, fout)
+        fout.close()
+        os.replace(temp_fname, cache_fname)
+    except OSError as err:
+        logging.warning('Unable to write kbd cache %r: %s' % (cache_fname, err))
+    #end try
+#end _save_kbd_cache
+
+def read_kdb(fname, cache_dir=None):
+    """Read the kdb file.
+    Args:
+      fname: name of the kbd file, relative to this directory or absolute.
+      cache_dir: if given, the parsed file is kept in a cache in this
+        directory, shared by all kbd files, and only parsed again when its
+        mtime or size changes.
+    """
+    fname = os.path.join(os.path.dirname(os.path.abspath(__file__)), fname)
+    if cache_dir is None:
+        logging.debug('Loading kbd file: %s' % fname)
+        return parse_kdb(codecs.open(fname, 'r', 'utf-8').read())
+    #end if
+    info = os.stat(fname)
+    stamp = (info.st_mtime_ns, info.st_size)
+    cache_fname = os.path.join(cache_dir, KBD_CACHE)
+    layouts = _load_kbd_cache(cache_fname)
+    entry = layouts.get(fname)
+    if entry is None or tuple(entry[0]) != stamp:
+        logging.debug('Loading kbd file: %s' % fname)
+        parsed = parse_kdb(codecs.open(fname, 'r', 'utf-8').read())
+        codes, levels = parsed.map, parsed.levels
+        layouts[fname] = (stamp, codes, levels)
+        _save_kbd_cache(cache_fname, layouts)
+    else:
+        logging.debug('Loading kbd file from cache: %s' % fname)
+        codes, levels = entry[1], entry[2]
+    #end if
+    return ModMapper.from_map(codes, levels)
 #end read_kdb
 
+KBD_FORMAT = 2
+  # version of the kbd files create_my_kdb() writes.  Version 1 files are
+  # space separated, with one label per key.  Version 2 files start with a
+  # "# kbd-format: 2" line and are tab separated, with the labels of the
+  # shift levels 2 (Shift), 3 (AltGr) and 4 (Shift+AltGr) after the short
+  # name, any of them may be empty.
+
 def parse_kdb(text):
-    """Parse a kdb text file."""
+    """Parse a kdb text file, of any version."""
+    re_version = re.compile(r'^#\s*kbd-format:\s*(\d+)')
     re_line = re.compile(r'(\d+) (\S+) (\S+)\s?(\S*)')
+    version = 1
     ret = ModMapper()
     for line in text.split('\n'):
         if not line:
             continue
-        grps = re_line.search(line)
+        grps = re_version.search(line)
         if grps:
-            ret.set_map \
-              (
-                int(grps.group(1)),
-                (grps.group(2), grps.group(3), grps.group(4))
-              )
+            version = int(grps.group(1))
+            continue
+        #end if
+        if line.startswith('#'):
+            continue
+        if version >= 2:
+            fields = line.split('\t') + 6 * ['']
+            if not fields[0].isdigit() or not fields[1] or not fields[2]:
+                continue
+            scancode = int(fields[0])
+            ret.set_map(scancode, tuple(fields[1:4]))
+            levels = tuple(fields[4:7])
+            if any(levels):
+                ret.levels[scancode] = levels
+            #end if
+        else:
+            grps = re_line.search(line)
+            if grps:
+                ret.set_map \
+                  (
+                    int(grps.group(1)),
+                    (grps.group(2), grps.group(3), grps.group(4))
+                  )
+            #end if
         #end if
     #end for
     ret.done()
@@ -338,47 +448,229 @@ def parse_kdb(text):
 #end parse_kdb
 
 def create_my_kdb(fname, codes):
-    """Create a kdb file from scancodes."""
+    """Create a kdb file from scancodes, in the current format."""
     fout = codecs.open(fname, 'w', 'utf-8')
-    fout.write('# This is a space separated file with UTF-8 encoding\n')
-    fout.write('# Short name is optional, will default to the medium-name\n')
-    fout.write('# Scancode Map-Name Medium-Name Short-Name\n')
+    fout.write('# kbd-format: %d\n' % KBD_FORMAT)
+    fout.write('# This is a tab separated file with UTF-8 encoding\n')
+    fout.write('# Short name and the shift level labels are optional\n')
+    fout.write('# Scancode Map-Name Medium-Name Short-Name Level-2 Level-3 Level-4\n')
     for code, (key, medium_name, short_name) in codes.map.items():
-        if short_name:
-            fout.write('%d %s %s %s\n' % (code, key, medium_name, short_name))
-        else:
-            fout.write('%d %s %s\n' % (code, key, medium_name))
-        #end if
+        fields = [str(code), key, medium_name, short_name or '']
+        fields.extend(codes.levels.get(code, ()))
+        fout.write('\t'.join(fields).rstrip('\t') + '\n')
     #end for
     print('Output %r with %d entries' % (fname, len(codes)))
     fout.close()
 #end create_my_kdb
 
-def mod_map_args():
-    """Return the arguments to pass to xmodmap."""
-    return ['xmodmap', '-display', ':0', '-pk']
-#end mod_map_args
+KEYSYM_GROUPS = \
+    (
+        'latin2', 'latin3', 'latin4', 'greek', 'cyrillic',
+        'technical', 'publishing', 'xkb', 'xf86',
+    )
+  # keysyms besides latin1 and miscellany, to know the names of
 
-def run_cmd(args):
-    """Run the command and collect the output."""
-    return \
-        subprocess.check_output \
+_keysym_names = None
+
+def keysym_names():
+    """Return a dict of keysym to its name, as xmodmap shows it."""
+    global _keysym_names
+    if _keysym_names is None:
+        from Xlib import XK
+        for group in KEYSYM_GROUPS:
+            XK.load_keysym_group(group)
+        #end for
+        _keysym_names = {}
+        for name in dir(XK):
+            if not name.startswith('XK_'):
+                continue
+            keysym = getattr(XK, name)
+            name = name[3:]
+            if name.startswith('XF86_'):
+                name = 'XF86' + name[5:]
+            #end if
+            if keysym not in _keysym_names or name.upper() in MEDIUM_NAME:
+                # of several names, prefer the one we have a label for.
+                _keysym_names[keysym] = name
+            #end if
+        #end for
+    #end if
+    return _keysym_names
+#end keysym_names
+
+def keysym_label(keysym):
+    """Return the character typed by keysym, or '' if it is not a
+    printable one."""
+    char = keysym_unicode.to_unicode(keysym)
+    if not char.isprintable() or char.isspace():
+        return ''
+    return char
+#end keysym_label
+
+def keysym_alias(keysym):
+    """Return the upper case name of keysym, ex. CYRILLIC_EF, U04D8 for
+    those only known by their character."""
+    alias = keysym_names().get(keysym)
+    if alias is None:
+        if keysym_unicode.UNICODE_KEYSYM <= keysym:
+            alias = 'U%04X' % (keysym - keysym_unicode.UNICODE_KEYSYM)
+        else:
+            alias = '%#x' % keysym
+        #end if
+    #end if
+    return alias.upper()
+#end keysym_alias
+
+def keysym_key(keysym):
+    """Return the key name (ex. KEY_CYRILLIC_EF) of keysym, as in the
+    keyboard map read from the X server."""
+    return ('KEY_' + keysym_alias(keysym)).replace('XF86', '')
+#end keysym_key
+
+def cap_label(char):
+    """Return the label of a key typing char, as printed on keycaps."""
+    upper = char.upper()
+    if len(upper) == 1:
+        return upper
+    return char
+#end cap_label
+
+_key_keysyms = None
+
+def key_label(key):
+    """Return the label of the key with the name key, as returned by
+    keysym_key(), from its character, or '' if not known."""
+    global _key_keysyms
+    keysym = None
+    if key.startswith('KEY_U'):
+        try:
+            keysym = keysym_unicode.UNICODE_KEYSYM + int(key[5:], 16)
+        except ValueError:
+            pass
+        #end try
+    #end if
+    if keysym is None:
+        if _key_keysyms is None:
+            _key_keysyms = {}
+            for sym in keysym_names():
+                _key_keysyms.setdefault(keysym_key(sym), sym)
+            #end for
+        #end if
+        keysym = _key_keysyms.get(key)
+    #end if
+    if keysym is None:
+        return ''
+    return cap_label(keysym_label(keysym))
+#end key_label
+
+GROUP_LEVEL_COLUMNS = \
+    (
+        # column of the shift levels 1 to 4 of each XKB group in the core
+        # keyboard mapping, the groups after these are not in it.
+        (0, 1, 4, 5),
+        (2, 3, 6, 7),
+    )
+
+def open_display(display=None):
+    """Return display, or a new connection to the X server of $DISPLAY."""
+    if display is None:
+        from Xlib import display as xdisplay
+        display = xdisplay.Display()
+    #end if
+    return display
+#end open_display
+
+def read_keyboard_mapping(display, group=0):
+    """Read the keycode to keysym table of the X server for the XKB group
+    group (from 0), in the format parse_modmap() returns plus the character
+    of each key.  Keys without keysyms of their own in the group are as in
+    the first group, like xlib.XEvents names them."""
+    min_keycode = display.display.info.min_keycode
+    max_keycode = display.display.info.max_keycode
+    if group >= len(GROUP_LEVEL_COLUMNS):
+        group = 0
+    #end if
+    ret = ModMapper()
+    keysyms = display.get_keyboard_mapping(min_keycode, max_keycode - min_keycode + 1)
+    for code, syms in enumerate(keysyms):
+        if not any(syms):
+            continue
+        columns = GROUP_LEVEL_COLUMNS[group]
+        if columns[0] >= len(syms) or not syms[columns[0]]:
+            columns = GROUP_LEVEL_COLUMNS[0]
+        #end if
+        keysym = syms[columns[0]]
+        if keysym:
+            alias = keysym_alias(keysym)
+        else:
+            alias = 'NOSYMBOL'
+        #end if
+        my_keyname = 'KEY_' + alias
+        my_keyname = my_keyname.replace('XF86', '')
+        ret.set_map(code, (my_keyname, alias, keysym_label(keysym)))
+        levels = tuple \
           (
-            args,
-            universal_newlines=True
+            keysym_label(syms[column]) if column < len(syms) else ''
+            for column in columns[1:]
           )
-#end run_cmd
+        if any(levels):
+            ret.levels[code] = levels
+        #end if
+    #end for
+    ret.done()
+    return ret
+#end read_keyboard_mapping
+
+def read_xkb_layouts(display):
+    """Return the XKB layout and variant of each group as kbd file names
+    without extension (ex. us, fr_oss), empty if not known."""
+    atom = display.intern_atom('_XKB_RULES_NAMES', True)
+    if not atom:
+        return []
+    from Xlib import X
+    prop = display.screen().root.get_full_property(atom, X.AnyPropertyType)
+    if prop is None:
+        return []
+    value = prop.value
+    if isinstance(value, bytes):
+        value = value.decode('latin-1')
+    #end if
+    # rules, model, layout, variant, options; several groups are comma separated.
+    names = value.split('\0') + 5 * ['']
+    variants = names[3].split(',')
+    ret = []
+    for i, layout in enumerate(names[2].split(',')):
+        if not layout:
+            break
+        if i < len(variants) and variants[i]:
+            layout += '_' + variants[i]
+        #end if
+        ret.append(layout)
+    #end for
+    return ret
+#end read_xkb_layouts
 
-def read_mod_map():
-    """Read a mod_map by runing xmodmap."""
-    logging.debug('Loading keymap from xmodmap...')
-    xmodmap = parse_modmap(run_cmd(mod_map_args()))
+def read_xkb_layout(display):
+    """Return the XKB layout and variant of the first group as a kbd file
+    name without extension, or None if not known."""
+    layouts = read_xkb_layouts(display)
+    if not layouts:
+        return None
+    return layouts[0]
+#end read_xkb_layout
+
+def read_mod_map(display=None, group=0):
+    """Read the mod_map of the X server for the XKB group group."""
+    logging.debug('Loading keymap of group %d from the X server...', group)
+    xmodmap = read_keyboard_mapping(open_display(display), group)
     ret = ModMapper()
     for code in xmodmap.map:
-        key = xmodmap[code][0]
-        key_name = xmodmap[code][1]
+        key, key_name, label = xmodmap[code]
         if key_name in MEDIUM_NAME:
             medium_name = MEDIUM_NAME[key_name]
+        elif label:
+            # ex. the letters of non Latin layouts
+            medium_name = cap_label(label)
         else:
             medium_name = key_name
         #end if
@@ -388,34 +680,42 @@ def read_mod_map():
             short_name = None
         #end if
         ret.set_map(code, (key, medium_name, short_name))
+        if code in xmodmap.levels:
+            ret.levels[code] = xmodmap.levels[code]
+        #end if
     #end for
     ret.done()
     return ret
 #end read_mod_map
 
-def safely_read_mod_map(fname, kbd_files):
+def safely_read_mod_map(fname, kbd_files, display=None, cache_dir=None, layout=None, group=0):
     """Read the specified mod_map file or get the US version by default.
     Args:
       fname: name of kbd file to read
       kbd_files: list of full path of kbd files
+      display: Xlib display to read the keyboard layout from, defaults to
+        a new connection.
+      cache_dir: directory of the cache of parsed kbd files, see read_kdb().
+      layout: the XKB layout to default to, instead of the one of the
+        first group of the server.
+      group: the XKB group of layout, from 0, whose keysyms to read from
+        the server when there is no kbd file for it.
     """
-    # Assigning a default kbdfile name using result of setxkbmap
+    # Assigning a default kbdfile name using the XKB layout of the server
     DEFAULT_KBD = None
     try:
-        # TODO is -print the new -query ?
-        for line in  run_cmd(('setxkbmap', '-print')).split('\n'):
-          if 'layout:' in line:
-              DEFAULT_KBD = line.split(':')[1].strip()
-          #end if
-          if 'variant:' in line:
-              DEFAULT_KBD += '_' + line.split(':')[1].strip()
-          #end if
+        display = open_display(display)
+        if layout:
+            DEFAULT_KBD = layout
+        else:
+            DEFAULT_KBD = read_xkb_layout(display)
+        #end if
         if DEFAULT_KBD:
-            logging.info('setxkbmap returns a keyboard layout_variant: %s' % DEFAULT_KBD)
+            logging.info('XKB keyboard layout_variant: %s' % DEFAULT_KBD)
             DEFAULT_KBD += '.kbd'
         #end if
-    except OSError:
-        pass
+    except Exception as err:
+        logging.warning('Unable to read the XKB layout: %s' % err)
     #end try
     if not DEFAULT_KBD:
         DEFAULT_KBD = 'us.kbd'
@@ -435,15 +735,15 @@ def safely_read_mod_map(fname, kbd_files):
             logging.warning('Can not find kbd file: %s' % fname)
         #end if
         if kbd_file:
-            return read_kdb(kbd_file)
+            return read_kdb(kbd_file, cache_dir)
     #end for
 
     ret = None
     if fname == 'xmodmap' or not kbd_default:
         try:
-            ret = read_mod_map()
-        except OSError:
-            logging.error('unable execute xmodmap')
+            ret = read_mod_map(display, group)
+        except Exception as err:
+            logging.error('Unable to read the keyboard mapping: %s' % err)
         #end try
     #end if
 
@@ -451,7 +751,7 @@ def safely_read_mod_map(fname, kbd_files):
         # Merge the defaults with modmap
         if fname == 'xmodmap':
             logging.debug('Merging with default kbd file: %s' % kbd_default)
-            defaults = read_kdb(kbd_default)
+            defaults = read_kdb(kbd_default, cache_dir)
             for keycode in defaults:
                 if keycode not in ret:
                     ret[keycode] = defaults[keycode]
@@ -459,7 +759,7 @@ def safely_read_mod_map(fname, kbd_files):
             #end for
         else:
             logging.debug('Using default kbd file: %s' % kbd_default)
-            ret = read_kdb(kbd_default)
+            ret = read_kdb(kbd_default, cache_dir)
         #end if
     else:
         logging.error('Can not find default kbd file')
@@ -467,6 +767,29 @@ def safely_read_mod_map(fname, kbd_files):
     return ret
 #end safely_read_mod_map
 
+def safely_read_group_mod_maps(fname, kbd_files, display=None, cache_dir=None):
+    """Return the mod maps of the XKB groups (layouts) of the server, one
+    per group.  Only one is returned if fname is given, as the kbd file
+    applies whatever the group, or if the groups are not known.  The
+    arguments are the same as for safely_read_mod_map()."""
+    layouts = []
+    if not fname:
+        try:
+            display = open_display(display)
+            layouts = read_xkb_layouts(display)
+        except Exception as err:
+            logging.warning('Unable to read the XKB layouts: %s' % err)
+        #end try
+    #end if
+    if len(layouts) < 2:
+        return [safely_read_mod_map(fname, kbd_files, display, cache_dir)]
+    return \
+        [
+            safely_read_mod_map(fname, kbd_files, display, cache_dir, layout, group)
+            for group, layout in enumerate(layouts)
+        ]
+#end safely_read_group_mod_maps
+
 def _run_test():
     """Run some tests on the my.kbd file."""
     filename = 'my.kdb'
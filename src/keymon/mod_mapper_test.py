@@ -0,0 +1,214 @@
+#!/usr/bin/python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+import unittest
+import mod_mapper
+
+class TestKbdCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tmpdir, 'cache')
+        self.kbd = os.path.join(self.tmpdir, 'xx.kbd')
+        self.write_kbd('30 KEY_A a\n31 KEY_S s S\n')
+        mod_mapper._kbd_caches.clear()
+    #end setUp
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        mod_mapper._kbd_caches.clear()
+    #end tearDown
+
+    def write_kbd(self, text):
+        fout = open(self.kbd, 'w', encoding='utf-8')
+        fout.write(text)
+        fout.close()
+    #end write_kbd
+
+    def test_same_as_parsed(self):
+        parsed = mod_mapper.read_kdb(self.kbd)
+        cached = mod_mapper.read_kdb(self.kbd, self.cache_dir)
+        self.assertEqual(cached.map, parsed.map)
+        self.assertEqual(cached.map[31], ('KEY_S', 's', 'S'))
+        self.assertEqual(cached.get_from_name('KEY_A'), (30, ('KEY_A', 'a', '')))
+    #end test_same_as_parsed
+
+    def test_read_from_cache_file(self):
+        mod_mapper.read_kdb(self.kbd, self.cache_dir)
+        self.assertTrue(os.path.exists(os.path.join(self.cache_dir, mod_mapper.KBD_CACHE)))
+        mod_mapper._kbd_caches.clear()
+        # parse_kdb is not called when the cache is valid.
+        parse_kdb = mod_mapper.parse_kdb
+        mod_mapper.parse_kdb = None
+        try:
+            cached = mod_mapper.read_kdb(self.kbd, self.cache_dir)
+        finally:
+            mod_mapper.parse_kdb = parse_kdb
+        #end try
+        self.assertEqual(cached.map[30], ('KEY_A', 'a', ''))
+    #end test_read_from_cache_file
+
+    def test_changed_file_is_parsed_again(self):
+        mod_mapper.read_kdb(self.kbd, self.cache_dir)
+        self.write_kbd('30 KEY_A q\n')
+        stat = os.stat(self.kbd)
+        os.utime(self.kbd, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+        cached = mod_mapper.read_kdb(self.kbd, self.cache_dir)
+        self.assertEqual(cached.map, {30: ('KEY_A', 'q', '')})
+    #end test_changed_file_is_parsed_again
+
+    def test_levels_are_cached(self):
+        self.write_kbd('# kbd-format: 2\n2\tKEY_1\t1\t\t!\n30\tKEY_A\tA\n')
+        mod_mapper.read_kdb(self.kbd, self.cache_dir)
+        mod_mapper._kbd_caches.clear()
+        cached = mod_mapper.read_kdb(self.kbd, self.cache_dir)
+        self.assertEqual(cached.levels, {2: ('!', '', '')})
+    #end test_levels_are_cached
+
+#end TestKbdCache
+
+class TestKbdFormat(unittest.TestCase):
+
+    def test_version_1(self):
+        parsed = mod_mapper.parse_kdb('# comment\n2 KEY_1 1\n14 KEY_BACKSPACE Back \u21fd\n')
+        self.assertEqual(parsed.map, {2: ('KEY_1', '1', ''), 14: ('KEY_BACKSPACE', 'Back', '\u21fd')})
+        self.assertEqual(parsed.levels, {})
+    #end test_version_1
+
+    def test_version_2(self):
+        parsed = mod_mapper.parse_kdb \
+          (
+            '# kbd-format: 2\n'
+            '# Scancode Map-Name Medium-Name Short-Name Level-2 Level-3 Level-4\n'
+            '2\tKEY_1\t1\t\t!\t\u00b9\t\u00a1\n'
+            '12\tKEY_MINUS\t-\n'
+            '14\tKEY_BACKSPACE\tBack\t\u21fd\n'
+          )
+        self.assertEqual \
+          (
+            parsed.map,
+            {
+                2: ('KEY_1', '1', ''),
+                12: ('KEY_MINUS', '-', ''),
+                14: ('KEY_BACKSPACE', 'Back', '\u21fd'),
+            }
+          )
+        self.assertEqual(parsed.levels, {2: ('!', '\u00b9', '\u00a1')})
+    #end test_version_2
+
+    def test_create_my_kdb(self):
+        codes = mod_mapper.ModMapper.from_map \
+          (
+            {2: ('KEY_1', '1', ''), 14: ('KEY_BACKSPACE', 'Back', 'Bk')},
+            {2: ('!', '', '\u00a1')}
+          )
+        tmpdir = tempfile.mkdtemp()
+        try:
+            fname = os.path.join(tmpdir, 'my.kbd')
+            mod_mapper.create_my_kdb(fname, codes)
+            parsed = mod_mapper.read_kdb(fname)
+        finally:
+            shutil.rmtree(tmpdir)
+        #end try
+        self.assertEqual(parsed.map, codes.map)
+        self.assertEqual(parsed.levels, codes.levels)
+    #end test_create_my_kdb
+
+    def test_keysym_label(self):
+        self.assertEqual(mod_mapper.keysym_label(0x21), '!')
+        self.assertEqual(mod_mapper.keysym_label(0xe9), '\u00e9')
+        self.assertEqual(mod_mapper.keysym_label(0x10020ac), '\u20ac')
+        self.assertEqual(mod_mapper.keysym_label(0xff0d), '')
+        self.assertEqual(mod_mapper.keysym_label(0x6c6), '\u0444')
+        self.assertEqual(mod_mapper.keysym_label(0x20), '')
+    #end test_keysym_label
+
+    def test_key_label(self):
+        self.assertEqual(mod_mapper.key_label('KEY_U04D9'), '\u04d8')
+        self.assertEqual(mod_mapper.cap_label('\u00df'), '\u00df')
+    #end test_keysym_label
+
+#end TestKbdFormat
+
+class Display:
+    """Just enough of an Xlib display for read_keyboard_mapping()."""
+
+    def __init__(self, keysyms):
+        self.keysyms = keysyms
+        self.display = self
+        self.info = self
+        self.min_keycode = 8
+        self.max_keycode = 8 + len(keysyms) - 1
+    #end __init__
+
+    def get_keyboard_mapping(self, first_keycode, count):
+        return self.keysyms[first_keycode - 8:first_keycode - 8 + count]
+    #end get_keyboard_mapping
+
+#end Display
+
+class TestServerMapping(unittest.TestCase):
+
+    def setUp(self):
+        self.keysym_names = mod_mapper._keysym_names
+        mod_mapper._keysym_names = \
+            {
+                0x32: '2', 0x40: 'at', 0x22: 'quotedbl',
+                0x61: 'a', 0x41: 'A', 0x6c6: 'Cyrillic_ef', 0x6e6: 'Cyrillic_EF',
+            }
+        # us,ru: the core mapping columns are group 1 levels 1 and 2, group 2
+        # levels 1 and 2, then group 1 levels 3 and 4.
+        self.display = Display \
+          (
+            [
+                [0] * 8,
+                [0x32, 0x40, 0x32, 0x22, 0, 0],
+                [0x61, 0x41, 0x6c6, 0x6e6],
+                [0x61, 0x41],
+            ]
+          )
+    #end setUp
+
+    def tearDown(self):
+        mod_mapper._keysym_names = self.keysym_names
+    #end tearDown
+
+    def test_first_group(self):
+        modmap = mod_mapper.read_mod_map(self.display, 0)
+        self.assertEqual(modmap.map[1], ('KEY_2', '2', None))
+        self.assertEqual(modmap.levels[1], ('@', '', ''))
+        self.assertEqual(modmap.map[2][0], 'KEY_A')
+    #end test_first_group
+
+    def test_second_group(self):
+        modmap = mod_mapper.read_mod_map(self.display, 1)
+        self.assertEqual(modmap.map[1], ('KEY_2', '2', None))
+        self.assertEqual(modmap.levels[1], ('"', '', ''))
+        self.assertEqual(modmap.map[2], ('KEY_CYRILLIC_EF', '\u0424', None))
+        self.assertEqual(modmap.levels[2], ('\u0424', '', ''))
+        # not in the second group
+        self.assertEqual(modmap.map[3][0], 'KEY_A')
+        self.assertNotIn(0, modmap.map)
+    #end test_second_group
+
+#end TestServerMapping
+
+if __name__ == '__main__':
+    unittest.main()
+#end if
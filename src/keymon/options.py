@@ -26,6 +26,7 @@ It uses configparser to save the variables to disk in ini format.
 """
 __author__ = 'Scott Kirkwood (scott+keymon@forusers.com)'
 
+import collections
 import configparser
 import gettext
 import logging
@@ -316,6 +317,11 @@ class Options:
         self._opt_group = None
         self._opt_group_desc = {}
         self._options_order = []
+        self._snapshot_types = {}
+          # tuple of dests to namedtuple type
+        self._saved_ini = None
+          # (ini group, ini name) to value in the ini file, as last read or
+          # written, None if unknown
     #end __init__
 
     def __getattr__(self, name):
@@ -393,12 +399,19 @@ class Options:
         #end for
     #end parse_args
 
-    def parse_ini(self, fp):
-        """Parse an ini file from fp, which is file-like class."""
+    def parse_ini(self, fp, changed_only=False):
+        """Parse an ini file from fp, which is file-like class.
+        Args:
+          fp: the ini file.
+          changed_only: only set the options whose value in the file is not
+            their saved value, the others keep their value from the command
+            line, if any.
+        """
 
         config = configparser.ConfigParser()
         config.readfp(fp)
         checker = set()
+        saved = {}
         for opt in self._options.values():
             if opt.ini_group:
                 checker.add(opt.ini_group + '-' + opt.ini_name)
@@ -407,7 +420,11 @@ class Options:
                     and
                         config.has_option(opt.ini_group, opt.ini_name)
                 ) :
-                    opt.value = config.get(opt.ini_group, opt.ini_name)
+                    value = config.get(opt.ini_group, opt.ini_name)
+                    saved[(opt.ini_group, opt.ini_name)] = value
+                    if changed_only and value == opt.ini_value:
+                        continue
+                    opt.value = value
                     LOG.info('From ini getting %s.%s = %s', opt.ini_group, opt.ini_name, opt.value)
                 #end if
             #end if
@@ -421,8 +438,24 @@ class Options:
                 #end if
             #end for
         #end for
+        self._saved_ini = saved
     #end parse_ini
 
+    def _ini_values(self):
+        """The values to save in the ini file, by (ini group, ini name)."""
+        return dict \
+          (
+            ((opt.ini_group, opt.ini_name), opt.ini_value)
+            for opt in self._options.values()
+            if opt.ini_group and opt.ini_value is not None
+          )
+    #end _ini_values
+
+    def is_dirty(self):
+        """Whether the ini file does not hold the current values."""
+        return self._ini_values() != self._saved_ini
+    #end is_dirty
+
     def write_ini(self, fp):
         """Write an ini file to fp, which is file-like class."""
 
@@ -451,7 +484,30 @@ class Options:
         #end if
     #end read_ini_file
 
+    def reread_ini_file(self):
+        """Read the ini file again after it was changed by someone else,
+        see parse_ini(changed_only = True)."""
+        LOG.info('Reading again from %r', self._ini_filename)
+        try:
+            fin = open(self._ini_filename, "r")
+            self.parse_ini(fin, changed_only = True)
+            fin.close()
+        except (OSError, configparser.Error) as err:
+            LOG.warning('Unable to read %r: %s', self._ini_filename, err)
+        #end try
+    #end reread_ini_file
+
+    @property
+    def ini_filename(self):
+        """Name of the ini file read by read_ini_file()."""
+        return self._ini_filename
+    #end ini_filename
+
     def save(self):
+        """Write the ini file, unless it already holds the current values."""
+        if not self.is_dirty():
+            LOG.debug('Config file %r is up to date', self._ini_filename)
+            return
         self._write_ini_file(self._ini_filename)
     #end save
 
@@ -466,13 +522,47 @@ class Options:
     #end _make_dirs
 
     def _write_ini_file(self, fname):
+        """Write the ini file under another name and rename it, so fname is
+        never left half written."""
         self._make_dirs(fname)
         LOG.info('Writing config file %r', fname)
-        fo = open(fname, 'w')
+        saved = self._ini_values()
+        tmp_fname = fname + '.tmp'
+        fo = open(tmp_fname, 'w')
         self.write_ini(fo)
+        fo.flush()
+        os.fsync(fo.fileno())
         fo.close()
+        os.replace(tmp_fname, fname)
+        self._saved_ini = saved
     #end _write_ini_file
 
+    def values(self):
+        """Return a snapshot of the values of all options, by dest."""
+        return dict((dest, opt.value) for dest, opt in self._options.items())
+    #end values
+
+    def changed_since(self, values):
+        """Return the set of dests of the options whose value is not the one
+        in values, a snapshot from values()."""
+        return set \
+          (
+            dest
+            for dest, opt in self._options.items()
+            if dest not in values or opt.value != values[dest]
+          )
+    #end changed_since
+
+    def snapshot(self, dests):
+        """Return a read-only copy of the current values of the options
+        dests, a namedtuple, for code reading them on every event."""
+        dests = tuple(dests)
+        if dests not in self._snapshot_types:
+            self._snapshot_types[dests] = collections.namedtuple('OptionsSnapshot', dests)
+        #end if
+        return self._snapshot_types[dests](*(self._options[dest].value for dest in dests))
+    #end snapshot
+
     def reset_to_defaults(self):
         """Reset ini file to defaults."""
         for opt in self._options.values():
@@ -484,7 +574,42 @@ class Options:
 
 #end Options
 
-if __name__ == '__main__':
+def _run_benchmark():
+    """Compare reading options through Options and through a snapshot, as
+    KeyMon does for each key event."""
+    import timeit
+    dests = ('only_combo', 'sticky_mode', 'opacity', 'no_press_fadeout', 'visible_click')
+    opts = Options()
+    for dest in dests:
+        opts.add_option(dest, 'float', 1.0)
+    #end for
+    snapshot = opts.snapshot(dests)
+
+    def from_options():
+        return \
+            (
+                opts.only_combo, opts.sticky_mode, opts.opacity,
+                opts.no_press_fadeout, opts.visible_click,
+            )
+    #end from_options
+
+    def from_snapshot():
+        return \
+            (
+                snapshot.only_combo, snapshot.sticky_mode, snapshot.opacity,
+                snapshot.no_press_fadeout, snapshot.visible_click,
+            )
+    #end from_snapshot
+
+    for title, func in (('options', from_options), ('snapshot', from_snapshot)):
+        secs = min(timeit.repeat(func, number = 100000, repeat = 5))
+        print('%-8s %.3f us per event' % (title, secs * 1000000 / 100000))
+    #end for
+#end _run_benchmark
+
+if __name__ == '__main__' and sys.argv[1:] == ['--benchmark']:
+    _run_benchmark()
+elif __name__ == '__main__':
     o = Options()
     o.add_option \
       (
@@ -15,6 +15,9 @@
 # limitations under the License.
 
 import io
+import os
+import shutil
+import tempfile
 import unittest
 import options
 
@@ -235,6 +238,17 @@ class TestOptions(unittest.TestCase):
         self.assertEqual(o.num99, 99)
     #end test_override_ini
 
+    def test_changed_only_ini(self):
+        self.options.parse_args("Usage", ['--num99', '50', '--num', '456'])
+        inout = io.StringIO('[ints]\nnum99 = 99\nnum = 345\n[options]\nfalse = 0\n')
+        self.options.parse_ini(inout, changed_only=True)
+
+        o = self.options
+        self.assertEqual(o.num99, 50)
+        self.assertEqual(o.num, 345)
+        self.assertFalse(o.fa)
+    #end test_changed_only_ini
+
     def test_to_ini_empty(self):
         inout = io.StringIO()
         self.options.write_ini(inout)
@@ -251,6 +265,61 @@ class TestOptions(unittest.TestCase):
         self.assertEquals('\n'.join(lines), contents)
     #end test_to_ini_empty
 
+    def test_save(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            fname = os.path.join(tmpdir, 'config')
+            self.options.read_ini_file(fname)
+            self.assertTrue(self.options.is_dirty())
+            self.options.save()
+            self.assertFalse(self.options.is_dirty())
+            self.assertEqual(os.listdir(tmpdir), ['config'])
+
+            fout = open(fname, 'a')
+            fout.write('# kept as long as nothing changes\n')
+            fout.close()
+            self.options.read_ini_file(fname)
+            self.options.parse_args("Usage", ['--num99', '50'])
+            self.options.save()
+            self.assertIn('# kept', open(fname).read())
+
+            self.options.num99 = 50
+            self.assertTrue(self.options.is_dirty())
+            self.options.save()
+            self.assertNotIn('# kept', open(fname).read())
+            self.assertIn('num99 = 50', open(fname).read())
+        finally:
+            shutil.rmtree(tmpdir)
+        #end try
+    #end test_save
+
+    def test_changed_since(self):
+        self.options.parse_args("Usage", [])
+        values = self.options.values()
+        self.assertEqual(values['num99'], 99)
+        self.assertEqual(self.options.changed_since(values), set())
+        self.options.num99 = 98
+        self.options.fa = False
+        self.options.x = True
+        self.assertEqual(self.options.changed_since(values), {'num99', 'x'})
+        self.assertEqual(values['num99'], 99)
+    #end test_changed_since
+
+    def test_snapshot(self):
+        self.options.parse_args("Usage", [])
+        snapshot = self.options.snapshot(('num99', 'fa'))
+        self.assertEqual((snapshot.num99, snapshot.fa), (99, False))
+        self.options.num99 = 98
+        self.assertEqual(snapshot.num99, 99)
+        self.assertEqual(self.options.snapshot(('num99', 'fa')).num99, 98)
+        with self.assertRaises(AttributeError):
+            snapshot.num99 = 1
+        #end with
+        with self.assertRaises(AttributeError):
+            snapshot.other = 1
+        #end with
+    #end test_snapshot
+
 #end TestOptions
 
 if __name__ == '__main__':
@@ -0,0 +1,298 @@
+#!/usr/bin/python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Draw the mouse follower and the clicks on fullscreen overlays.
+
+Instead of moving shaped windows around, one transparent window covers
+each monitor.  It ignores input, so clicks go through it, and it stays
+mapped: drawing the follower, its trail and the click ripples only
+repaints the area they cover in the current and the previous frame.
+
+This needs a compositing manager, see supported().
+"""
+
+import collections
+import cairo
+import gi
+gi.require_version("Gdk", "3.0")
+gi.require_version("Gtk", "3.0")
+from gi.repository import \
+    Gdk, \
+    Gtk
+
+from keymon import lazy_pixbuf_creator
+
+TRAIL_LENGTH = 8
+  # number of frames the follower leaves a trail for
+RIPPLE_GROWTH = 1.0
+  # how much a click ripple grows while it fades
+
+Ripple = collections.namedtuple('Ripple', ('x', 'y', 'start'))
+  # position in root coordinates, frame time in microseconds.
+
+def supported():
+    """Whether transparent windows can be shown, otherwise each overlay
+    would be an opaque window hiding its monitor."""
+    screen = Gdk.Screen.get_default()
+    return screen.is_composited() and screen.get_rgba_visual() is not None
+#end supported
+
+class PointerOverlay(Gtk.Window):
+    """Transparent click-through window covering one monitor."""
+
+    def __init__(self, monitor, pixbufs, timeout):
+        Gtk.Window.__init__(self, type=Gtk.WindowType.POPUP)
+        self.geometry = monitor.get_geometry()
+        self.pixbufs = pixbufs
+        self.timeout = timeout
+        self.follower = None
+          # position of the follower, in root coordinates
+        self.trail = collections.deque(maxlen=TRAIL_LENGTH)
+        self.ripples = []
+        self.now = 0
+          # frame time of the current frame
+        self.drawn = None
+          # area painted in the last frame
+        self.tick = None
+        self.set_app_paintable(True)
+        visual = self.get_screen().get_rgba_visual()
+        if visual:
+            self.set_visual(visual)
+        #end if
+        self.set_decorated(False)
+        self.set_keep_above(True)
+        self.set_accept_focus(False)
+        self.set_skip_taskbar_hint(True)
+        self.set_skip_pager_hint(True)
+        self.move(self.geometry.x, self.geometry.y)
+        self.resize(self.geometry.width, self.geometry.height)
+        self.connect('realize', self._on_realize)
+        self.connect('draw', self._on_draw)
+    #end __init__
+
+    def _on_realize(self, unused_widget):
+        # an empty input shape makes the window transparent to clicks.
+        self.get_window().input_shape_combine_region(cairo.Region(), 0, 0)
+    #end _on_realize
+
+    def contains(self, x, y):
+        geom = self.geometry
+        return \
+            (
+                geom.x <= x < geom.x + geom.width
+            and
+                geom.y <= y < geom.y + geom.height
+            )
+    #end contains
+
+    def move_follower(self, x, y):
+        """Show the follower at this position, on the next frame."""
+        self.follower = (x, y)
+        self._animate()
+    #end move_follower
+
+    def hide_follower(self):
+        self.follower = None
+        self._animate()
+    #end hide_follower
+
+    def add_ripple(self, x, y):
+        """Show a click at this position."""
+        self.ripples.append(Ripple(x, y, None))
+        self._animate()
+    #end add_ripple
+
+    def _animate(self):
+        if self.tick is None:
+            self.tick = self.add_tick_callback(self._on_tick)
+        #end if
+    #end _animate
+
+    def _on_tick(self, unused_widget, frame_clock):
+        now = frame_clock.get_frame_time()
+        self.ripples = \
+            [
+                ripple._replace(start = now) if ripple.start is None else ripple
+                for ripple in self.ripples
+                if ripple.start is None or now - ripple.start < self.timeout * 1000000
+            ]
+        self.trail.append(self.follower)
+        self.now = now
+        area = self._area()
+        if self.drawn is not None:
+            damage = self.drawn.copy()
+            damage.union(area)
+        else:
+            damage = area
+        #end if
+        self.drawn = area
+        self.get_window().invalidate_region(damage, False)
+        if not self.ripples and all(pos == self.follower for pos in self.trail):
+            # nothing moves any more.
+            self.tick = None
+            return False
+        #end if
+        return True
+    #end _on_tick
+
+    def _items(self):
+        """Yield the image, position relative to the window, scale and
+        opacity of everything to draw."""
+        follower = self.pixbufs.get('follower')
+        for i, pos in enumerate(self.trail):
+            if pos is not None:
+                yield follower, pos, 1.0, (i + 1) / len(self.trail)
+            #end if
+        #end for
+        indicator = self.pixbufs.get('indicator')
+        for ripple in self.ripples:
+            if ripple.start is None:
+                # not started until the next frame
+                continue
+            progress = (self.now - ripple.start) / (self.timeout * 1000000)
+            yield indicator, (ripple.x, ripple.y), 1.0 + progress * RIPPLE_GROWTH, 1.0 - progress
+        #end for
+    #end _items
+
+    def _item_rect(self, img, pos, scale):
+        width, height = lazy_pixbuf_creator.image_size(img)
+        width, height = round(width * scale), round(height * scale)
+        return cairo.RectangleInt \
+          (
+            round(pos[0] - self.geometry.x - width / 2),
+            round(pos[1] - self.geometry.y - height / 2),
+            width,
+            height
+          )
+    #end _item_rect
+
+    def _area(self):
+        area = cairo.Region()
+        for img, pos, scale, unused_alpha in self._items():
+            area.union(self._item_rect(img, pos, scale))
+        #end for
+        return area
+    #end _area
+
+    def _on_draw(self, unused_widget, gc):
+        gc.set_operator(cairo.Operator.SOURCE)
+        gc.set_source_rgba(0, 0, 0, 0)
+        gc.paint()
+        gc.set_operator(cairo.Operator.OVER)
+        if self.tick is None and self.follower is None:
+            return False
+        for img, pos, scale, alpha in self._items():
+            rect = self._item_rect(img, pos, scale)
+            gc.save()
+            gc.translate(rect.x, rect.y)
+            gc.scale(scale, scale)
+            gc.set_source_surface(img, 0, 0)
+            gc.paint_with_alpha(alpha)
+            gc.restore()
+        #end for
+        return False
+    #end _on_draw
+
+#end PointerOverlay
+
+class PointerOverlays:
+    """One PointerOverlay per monitor, shown once and kept mapped."""
+
+    def __init__(self, indicator_fname, follower_fname, timeout):
+        self.timeout = timeout
+        self.pixbufs = lazy_pixbuf_creator.LazyPixbufCreator \
+          (
+            {
+                'indicator' : [indicator_fname],
+                'follower' : [follower_fname],
+            },
+            1.0,
+            device_scale = Gdk.get_default_root_window().get_scale_factor()
+          )
+        self.overlays = []
+        self.current = None
+          # overlay showing the follower
+        self._create_overlays()
+        Gdk.Screen.get_default().connect('monitors-changed', self._monitors_changed)
+    #end __init__
+
+    def _create_overlays(self):
+        display = Gdk.Display.get_default()
+        self.overlays = \
+            [
+                PointerOverlay(display.get_monitor(i), self.pixbufs, self.timeout)
+                for i in range(display.get_n_monitors())
+            ]
+        for overlay in self.overlays:
+            overlay.show()
+        #end for
+    #end _create_overlays
+
+    def _monitors_changed(self, unused_screen):
+        # monitors were added, removed or moved: cover the new ones.
+        for overlay in self.overlays:
+            overlay.destroy()
+        #end for
+        self.current = None
+        self._create_overlays()
+    #end _monitors_changed
+
+    def set_timeout(self, timeout):
+        self.timeout = timeout
+        for overlay in self.overlays:
+            overlay.timeout = timeout
+        #end for
+    #end set_timeout
+
+    def _overlay_at(self, x, y):
+        for overlay in self.overlays:
+            if overlay.contains(x, y):
+                return overlay
+            #end if
+        #end for
+        return None
+    #end _overlay_at
+
+    def move_follower(self, x, y):
+        overlay = self._overlay_at(x, y)
+        if overlay is not self.current and self.current is not None:
+            self.current.hide_follower()
+        #end if
+        self.current = overlay
+        if overlay:
+            overlay.move_follower(x, y)
+        #end if
+    #end move_follower
+
+    def hide_follower(self):
+        if self.current:
+            self.current.hide_follower()
+            self.current = None
+        #end if
+    #end hide_follower
+
+    def click(self, x=None, y=None):
+        """Show a ripple where the pointer is."""
+        if x is None or y is None:
+            _, x, y, _ = Gdk.get_default_root_window().get_pointer()
+        #end if
+        overlay = self._overlay_at(x, y)
+        if overlay:
+            overlay.add_ripple(x, y)
+        #end if
+    #end click
+
+#end PointerOverlays
@@ -21,7 +21,6 @@ __author__ = 'scott@forusers.com (Scott Kirkwood)'
 import os
 import gettext
 import logging
-from configparser import ConfigParser
 import gi
 gi.require_version("Gdk", "3.0")
 gi.require_version("Gtk", "3.0")
@@ -29,6 +28,9 @@ from gi.repository import \
     GObject, \
     Gtk
 
+from keymon import discovery
+from keymon import theme_bundle
+
 LOG = logging.getLogger('settings')
 
 class SettingsDialog(Gtk.Dialog):
@@ -294,6 +296,9 @@ class MiscFrame(CommonFrame):
             4
           )
 
+        # themes or kbd files may have been added since startup
+        self.settings.options.themes = get_themes(refresh=True)
+        self.settings.options.kbd_files = get_kbd_files()
         self.themes = list(self.settings.options.themes.keys())
         self._add_dropdown \
           (
@@ -432,6 +437,16 @@ def get_config_dir():
       )
 #end get_config_dir
 
+def get_cache_dir():
+    """Return the base directory for cached files."""
+    return \
+      (
+            os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache'))
+        +
+            '/key-mon'
+      )
+#end get_cache_dir
+
 def get_config_dirs(kind):
     """Return search paths of certain kind of configuration directory.
     Args:
@@ -452,44 +467,49 @@ def get_config_dirs(kind):
     return config_dirs
 #end get_config_dirs
 
-def get_themes():
+def get_discovery_index(refresh=False):
+    """Return the index of the themes and kbd files, see discovery.py.
+    Args:
+      refresh: scan the directories even if the cached index is valid.
+    """
+    return discovery.get_index \
+      (
+        get_config_dirs('themes'),
+        get_config_dirs(''),
+        get_cache_dir(),
+        refresh
+      )
+#end get_discovery_index
+
+def get_themes(refresh=False):
     """Return a dict of themes.
       keys are theme names
       values are tuples of (description, path)
         path is where the theme directory located,
         i.e. theme files are path/*.
+    Args:
+      refresh: scan the theme directories even if the cached index is valid.
     """
-    theme_dirs = get_config_dirs('themes')
-    themes = {}
-    for theme_dir in theme_dirs:
-        for entry in sorted(os.listdir(theme_dir)):
-            try:
-                parser = ConfigParser()
-                theme_config = os.path.join(theme_dir, entry, 'config')
-                parser.read(theme_config)
-                desc = parser.get('theme', 'description')
-                if entry not in themes:
-                    themes[entry] = (desc, os.path.join(theme_dir, entry))
-                #end if
-            except:
-                LOG.warning(_('Unable to read theme %r') % (theme_config))
-            #end try
-        #end for
-    #end for
-    return themes
+    return get_discovery_index(refresh)['themes']
 #end get_themes
 
+def open_theme(path):
+    """Return the directory holding the files of a theme and a dict of image
+    name to file name, or None if images should be looked up in the
+    directory.
+    Args:
+      path: the path of the theme as returned by get_themes().
+    """
+    if path.endswith(theme_bundle.BUNDLE_EXT):
+        bundle = theme_bundle.ThemeBundle(path)
+        return bundle.extract(get_cache_dir()), bundle.files
+    #end if
+    return path, get_discovery_index()['theme_files'].get(path)
+#end open_theme
+
 def get_kbd_files():
     """Return a list of kbd file paths"""
-    config_dirs = get_config_dirs('')
-    kbd_files = \
-        [
-            os.path.join(d, f)
-            for d in config_dirs
-            for f in sorted(os.listdir(d))
-            if f.endswith('.kbd')
-        ]
-    return kbd_files
+    return get_discovery_index()['kbd_files']
 #end get_kbd_files
 
 if __name__ == '__main__':
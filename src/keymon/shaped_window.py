@@ -19,47 +19,79 @@
 Thanks to mathias.gumz for the original code.
 """
 
+import logging
+import time
 import gi
 gi.require_version("Gtk", "3.0")
 from gi.repository import \
-    GObject, \
     Gdk, \
     Gtk
 
 from . import lazy_pixbuf_creator
 
+OPACITY = 0.5
+POOL_SIZE = 4
+  # click indicators which can be visible at the same time
+
 class ShapedWindow(Gtk.Window):
     """Create a window shaped as fname."""
 
     def __init__(self, fname, scale=1.0, timeout=0.2):
         Gtk.Window.__init__(self)
         self.connect('size-allocate', self._on_size_allocate)
+        self.connect('notify::scale-factor', self._on_scale_factor_changed)
         self.set_decorated(False)
         self.set_keep_above(True)
         self.set_accept_focus(False)
         self.scale = scale
-        self.shown = False
         self.timeout = timeout
-        self.timeout_timer = None
+        self.fade_tick = None
+        self.fade_start = None
+        self.pending_pos = None
+          # latest pointer position not moved to yet
+        self.move_tick = None
+        self.moves_latched = 0
         self.name_fnames = \
             {
                 'mouse' : [fname],
             }
-        self.pixbufs = lazy_pixbuf_creator.LazyPixbufCreator(self.name_fnames, self.scale)
-        self.pixbuf = self.pixbufs.get('mouse')
-        self.resize(self.pixbuf.get_width(), self.pixbuf.get_height())
-
-        # a pixmap widget to contain the pixmap
-        self.image = Gtk.Image()
-        self.mask = Gdk.cairo_region_create_from_surface \
+        self.pixbufs = lazy_pixbuf_creator.LazyPixbufCreator \
           (
-            Gdk.cairo_surface_create_from_pixbuf(self.pixbuf, 1, None)
+            self.name_fnames,
+            self.scale,
+            device_scale = self.get_scale_factor()
           )
-        self.image.set_from_pixbuf(self.pixbuf)
+        # a pixmap widget to contain the pixmap
+        self.image = Gtk.Image()
+        self._load_image()
         self.image.show()
         self.add(self.image)
     #end __init__
 
+    def _load_image(self):
+        """(Re)load the image and the window shape from it."""
+        self.pixbuf = self.pixbufs.get('mouse')
+        device_scale = self.pixbufs.device_scale
+        self.resize \
+          (
+            self.pixbuf.get_width() // device_scale,
+            self.pixbuf.get_height() // device_scale
+          )
+        self.mask = Gdk.cairo_region_create_from_surface(self.pixbuf)
+        self.image.set_from_surface(self.pixbuf)
+    #end _load_image
+
+    def _on_scale_factor_changed(self, win, unused_pspec):
+        """Called when moved to a monitor with another scale factor."""
+        if self.pixbufs.set_device_scale(self.get_scale_factor()):
+            self._load_image()
+            gdk_window = self.get_property("window")
+            if gdk_window != None :
+                gdk_window.shape_combine_region(self.mask, 0, 0)
+            #end if
+        #end if
+    #end _on_scale_factor_changed
+
     def _on_size_allocate(self, win, unused_allocation):
         """Called when first allocated."""
         # Set the window shape
@@ -70,16 +102,31 @@ class ShapedWindow(Gtk.Window):
             if not win.is_composited():
                 print('Unable to fade the window')
             else:
-                win.set_opacity(0.5)
+                win.set_opacity(OPACITY)
             #end if
         #end if
     #end _on_size_allocate
 
     def center_on_cursor(self, x=None, y=None):
+        """Center the window on the pointer.  While the window is visible the
+        move is only done on the next frame, to the latest position given."""
         if x is None or y is None:
             root = Gdk.get_default_root_window()
             _, x, y, _ = root.get_pointer()
         #end if
+        if not self.get_visible():
+            self.pending_pos = None
+            self._move_to(x, y)
+            return
+        #end if
+        self.pending_pos = (x, y)
+        self.moves_latched += 1
+        if self.move_tick is None:
+            self.move_tick = self.add_tick_callback(self._on_move_tick)
+        #end if
+    #end center_on_cursor
+
+    def _move_to(self, x, y):
         w, h = self.get_size()
         new_x, new_y = x - w/2, y - h/2
         pos = self.get_position()
@@ -87,38 +134,125 @@ class ShapedWindow(Gtk.Window):
             self.move(new_x, new_y)
             self.show()
         #end if
-    #end center_on_cursor
+    #end _move_to
+
+    def _on_move_tick(self, unused_widget, unused_frame_clock):
+        """Frame clock callback, does the move latched since the last frame."""
+        if self.pending_pos is None:
+            # pointer stopped, no need to wake up every frame.
+            self.move_tick = None
+            return False
+        #end if
+        start = time.perf_counter()
+        self._move_to(*self.pending_pos)
+        logging.debug \
+          (
+            'mouse window moved to %d, %d: %d motions this frame, %.3f ms',
+            self.pending_pos[0], self.pending_pos[1],
+            self.moves_latched,
+            (time.perf_counter() - start) * 1000
+          )
+        self.pending_pos = None
+        self.moves_latched = 0
+        return True
+    #end _on_move_tick
 
     def show(self):
         """Show this mouse indicator and ignore awaiting fade away request."""
-        if self.timeout_timer and self.shown:
-          # There is a fade away request, ignore it
-          GObject.source_remove(self.timeout_timer)
-          self.timeout_timer = None
-          # This method only is called when mouse is pressed, so there will be a
-          # release and fade_away call, no need to set up another timer.
+        if self.fade_tick:
+            # There is a fade away going on, stop it
+            self.remove_tick_callback(self.fade_tick)
+            self.fade_tick = None
+            self.set_opacity(OPACITY)
+            # This method only is called when mouse is pressed, so there will be a
+            # release and fade_away call, no need to restart the fade.
         #end if
         super(ShapedWindow, self).show()
     #end show
 
-    def maybe_show(self):
-        if self.shown or not self.timeout_timer:
-            return
-        self.shown = True
-        self.show()
-    #end maybe_show
-
-    def delayed_hide(self) :
-        self.hide()
-        self.timeout_timer = None
-          # so I don’t try to remove expired timer
-        return False
-    #end delayed_hide
-
     def fade_away(self):
-        """Make the window fade in a little bit."""
-        self.shown = False
-        self.timeout_timer = GObject.timeout_add(round(self.timeout * 1000), self.delayed_hide)
+        """Make the window fade away, then hide it."""
+        if self.fade_tick is None:
+            self.fade_start = None
+            self.fade_tick = self.add_tick_callback(self._on_fade_tick)
+        #end if
     #end fade_away
 
+    def _on_fade_tick(self, unused_widget, frame_clock):
+        """Frame clock callback of fade_away."""
+        now = frame_clock.get_frame_time()
+        if self.fade_start is None:
+            self.fade_start = now
+        #end if
+        progress = (now - self.fade_start) / (self.timeout * 1000000)
+        if progress >= 1:
+            self.hide()
+            self.set_opacity(OPACITY)
+            self.fade_tick = None
+            return False
+        #end if
+        self.set_opacity(OPACITY * (1 - progress))
+        return True
+    #end _on_fade_tick
+
 #end ShapedWindow
+
+class ShapedWindowPool:
+    """Click indicators created in advance and handed out round-robin, so
+    each click of a fast double click or drag gets its own one."""
+
+    def __init__(self, fname, scale=1.0, timeout=0.2, size=POOL_SIZE):
+        self.windows = [ShapedWindow(fname, scale, timeout) for _ in range(size)]
+        for win in self.windows:
+            # creates the window and shapes it, without showing it.
+            win.realize()
+            win.get_property("window").shape_combine_region(win.mask, 0, 0)
+        #end for
+        self.next = 0
+        self.pressed = None
+          # indicator of the button currently down
+    #end __init__
+
+    def set_timeout(self, timeout):
+        for win in self.windows:
+            win.timeout = timeout
+        #end for
+    #end set_timeout
+
+    def press(self):
+        """Show the next indicator where the pointer is."""
+        if self.pressed:
+            self.pressed.fade_away()
+        #end if
+        win = self.windows[self.next]
+        self.next = (self.next + 1) % len(self.windows)
+        win.hide()
+        win.center_on_cursor()
+          # moved right away as it is hidden
+        win.show()
+          # stops any fade left over from its previous click
+        self.pressed = win
+    #end press
+
+    def release(self):
+        if self.pressed:
+            self.pressed.fade_away()
+            self.pressed = None
+        #end if
+    #end release
+
+    def pointer_moved(self, x, y):
+        """Keep the indicator of the button currently down under the pointer."""
+        if self.pressed:
+            self.pressed.center_on_cursor(x, y)
+        #end if
+    #end pointer_moved
+
+    def hide(self):
+        for win in self.windows:
+            win.hide()
+        #end for
+        self.pressed = None
+    #end hide
+
+#end ShapedWindowPool
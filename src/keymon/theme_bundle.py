@@ -0,0 +1,269 @@
+#!/usr/bin/python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Compile themes into single file bundles, and load them back.
+
+A bundle is a zip file holding a manifest.json, the theme's SVG files with
+the editor metadata stripped and optionally its sprite atlases.  The
+manifest has the theme description and resolves every image name, with
+and without the '-small' suffix, to the member to use so no file system
+probing is needed when looking up an image.
+
+Bundles are found next to theme directories as <theme>.kmtheme and take
+precedence over a directory of the same name.
+"""
+
+__author__ = 'Scott Kirkwood (scott+keymon@forusers.com)'
+
+import json
+import logging
+import optparse
+import os
+import re
+import shutil
+import sys
+import tempfile
+import xml.etree.ElementTree as ET
+import zipfile
+from configparser import ConfigParser
+
+BUNDLE_EXT = '.kmtheme'
+MANIFEST = 'manifest.json'
+BUNDLE_VERSION = 1
+
+REQUIRED_IMAGES = \
+    (
+        'alt', 'altgr', 'ctrl', 'left-mouse', 'meta', 'middle-mouse',
+        'mouse', 'mouse-follower', 'mouse-indicator', 'multi-char-template',
+        'one-char-numpad-template', 'one-char-template', 'one-line-wide',
+        'right-mouse', 'scroll-dn-mouse', 'scroll-lft-mouse',
+        'scroll-rgt-mouse', 'scroll-up-mouse', 'shift', 'two-line-wide',
+        'whiteout-48', 'whiteout-58', 'whiteout-72',
+    )
+
+EDITOR_PREFIXES = ('sodipodi', 'inkscape')
+
+class ThemeException(Exception):
+    pass
+#end ThemeException
+
+def strip_svg(fbytes):
+    """Remove editor metadata and comments from an SVG file.
+
+    This is done on the text rather than through a parser so that the
+    placeholders replaced by fix_svg_key_closure, like '&amp;' and
+    '&#8203;', are left exactly as they were.
+    """
+    text = fbytes.decode('utf-8')
+    prefixes = '|'.join(EDITOR_PREFIXES)
+    text = re.sub(r'<!--.*?-->', '', text, flags = re.DOTALL)
+    text = re.sub(r'<metadata\b[^>]*?(/>|>.*?</metadata>)', '', text, flags = re.DOTALL)
+    text = re.sub \
+      (
+        r'<(%s):([\w-]+)\b[^>]*?(/>|>.*?</\1:\2>)' % prefixes,
+        '',
+        text,
+        flags = re.DOTALL
+      )
+    text = re.sub(r'\s+(%s):[\w-]+="[^"]*"' % prefixes, '', text)
+    text = re.sub(r';?-(%s)-[\w-]+:[^;"]*' % prefixes, '', text)
+    for prefix in re.findall(r'\sxmlns:([\w-]+)="[^"]*"', text):
+        if not re.search(r'[<\s]%s:' % prefix, text):
+            text = re.sub(r'\s+xmlns:%s="[^"]*"' % prefix, '', text)
+        #end if
+    #end for
+    text = re.sub(r'\n\s*\n', '\n', text)
+    ret = text.encode('utf-8')
+    try:
+        ET.fromstring(ret)
+    except ET.ParseError:
+        logging.warning('Stripped SVG no longer parses, keeping it as is')
+        ret = fbytes
+    #end try
+    return ret
+#end strip_svg
+
+def read_theme_config(theme_dir):
+    """Return the [theme] section of a theme's config as a dict."""
+    parser = ConfigParser()
+    parser.read(os.path.join(theme_dir, 'config'))
+    if not parser.has_option('theme', 'description'):
+        raise ThemeException('%r has no theme description in its config' % theme_dir)
+    #end if
+    return dict(parser.items('theme'))
+#end read_theme_config
+
+def theme_files(entries):
+    """Return the dict of image name, with and without the '-small'
+    suffix, to the file to use, given the entries of a theme directory."""
+    svgs = dict \
+      (
+        (entry[:-len('.svg')], entry)
+        for entry in entries
+        if entry.endswith('.svg')
+      )
+    ret = {}
+    for name in svgs:
+        if name.endswith('-small'):
+            continue
+        ret[name] = svgs[name]
+        ret[name + '-small'] = svgs.get(name + '-small', svgs[name])
+    #end for
+    return ret
+#end theme_files
+
+def compile_theme(theme_dir, out_fname, rasters=False):
+    """Validate a theme directory and write it out as a bundle.
+    Args:
+      theme_dir: directory of the theme.
+      out_fname: name of the bundle to write.
+      rasters: also pre-render and include the sprite atlases.
+    """
+    theme_dir = os.path.abspath(theme_dir)
+    manifest = dict(read_theme_config(theme_dir))
+    manifest['version'] = BUNDLE_VERSION
+    svgs = [entry for entry in os.listdir(theme_dir) if entry.endswith('.svg')]
+    files = theme_files(svgs)
+    missing = [name for name in REQUIRED_IMAGES if name not in files]
+    if missing:
+        raise ThemeException('%r lacks %s' % (theme_dir, ', '.join(sorted(missing))))
+    #end if
+    manifest['files'] = files
+
+    bundle = zipfile.ZipFile(out_fname + '.tmp', 'w', zipfile.ZIP_DEFLATED)
+    for entry in sorted(svgs):
+        fbytes = open(os.path.join(theme_dir, entry), 'rb').read()
+        try:
+            ET.fromstring(fbytes)
+        except ET.ParseError as exp:
+            bundle.close()
+            os.unlink(out_fname + '.tmp')
+            raise ThemeException('%r is not valid: %s' % (entry, exp))
+        #end try
+        bundle.writestr(entry, strip_svg(fbytes))
+    #end for
+    if rasters:
+        from keymon import atlas
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            for scale in atlas.SCALES:
+                fname = atlas.build_atlas(theme_dir, scale, tmp_dir)
+                bundle.write(fname, os.path.basename(fname))
+                bundle.write(fname + '.idx', os.path.basename(fname) + '.idx')
+            #end for
+        finally:
+            shutil.rmtree(tmp_dir)
+        #end try
+    #end if
+    bundle.writestr(MANIFEST, json.dumps(manifest, indent = 1, sort_keys = True))
+    bundle.close()
+    os.rename(out_fname + '.tmp', out_fname)
+    print('Output %r with %d images' % (out_fname, len(svgs)))
+#end compile_theme
+
+class ThemeBundle:
+    """A compiled theme, only its manifest is read until it's used."""
+
+    def __init__(self, fname):
+        self.fname = fname
+        bundle = zipfile.ZipFile(fname)
+        try:
+            self.manifest = json.loads(bundle.read(MANIFEST).decode('utf-8'))
+        finally:
+            bundle.close()
+        #end try
+        if self.manifest.get('version') != BUNDLE_VERSION:
+            raise ThemeException('%r has unsupported version' % fname)
+        #end if
+    #end __init__
+
+    @property
+    def description(self):
+        return self.manifest['description']
+    #end description
+
+    @property
+    def files(self):
+        """dict of image name (with any '-small' suffix) to file name."""
+        return self.manifest['files']
+    #end files
+
+    def extract(self, cache_dir):
+        """Unpack the bundle once into cache_dir, return the directory."""
+        stat = os.stat(self.fname)
+        dest = os.path.join \
+          (
+            cache_dir,
+            'themes',
+            '%s-%d-%d' % (os.path.basename(self.fname), stat.st_mtime_ns, stat.st_size)
+          )
+        if not os.path.isdir(dest):
+            logging.info('Extracting theme %r to %r', self.fname, dest)
+            os.makedirs(os.path.dirname(dest), exist_ok = True)
+            tmp_dir = tempfile.mkdtemp(dir = os.path.dirname(dest))
+              # private to this process, several may be extracting at once
+            bundle = zipfile.ZipFile(self.fname)
+            bundle.extractall(tmp_dir)
+            bundle.close()
+            try:
+                os.rename(tmp_dir, dest)
+            except OSError:
+                if not os.path.isdir(dest):
+                    raise
+                # another instance got there first.
+                shutil.rmtree(tmp_dir, ignore_errors = True)
+            #end try
+        #end if
+        return dest
+    #end extract
+
+#end ThemeBundle
+
+def main():
+    """key-mon-compile-theme command."""
+    parser = optparse.OptionParser('Usage: %prog [options] theme-dir')
+    parser.add_option \
+      (
+        '-o',
+        '--output',
+        dest='output',
+        help='Bundle to write, defaults to <theme-dir>%s' % BUNDLE_EXT
+      )
+    parser.add_option \
+      (
+        '--rasters',
+        dest='rasters',
+        action='store_true',
+        default=False,
+        help='Include pre-rendered sprite atlases'
+      )
+    opts, args = parser.parse_args()
+    if len(args) != 1:
+        parser.error('Expected one theme directory')
+    #end if
+    theme_dir = args[0].rstrip('/')
+    output = opts.output or os.path.basename(theme_dir) + BUNDLE_EXT
+    try:
+        compile_theme(theme_dir, output, opts.rasters)
+    except ThemeException as exp:
+        print('Error: %s' % exp)
+        sys.exit(1)
+    #end try
+#end main
+
+if __name__ == '__main__':
+    main()
+#end if
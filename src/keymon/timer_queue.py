@@ -0,0 +1,98 @@
+#!/usr/bin/python3
+#
+# Copyright 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Deadlines of any number of timers with a single GLib timeout.
+
+The pending deadlines are kept in a heap on the monotonic clock, and one
+GLib timeout is armed for the earliest of them.  Nothing runs while no
+deadline is due.
+"""
+
+import heapq
+import itertools
+import math
+import time
+from gi.repository import \
+    GLib
+
+class TimerQueue:
+    """Calls functions at deadlines."""
+
+    def __init__(self):
+        self.heap = []
+          # (deadline, sequence number, callback), cancelled ones have a None callback.
+        self.entries = {}
+          # callback to its heap entry
+        self.counter = itertools.count()
+        self.source = None
+        self.armed_for = None
+          # deadline self.source fires at
+    #end __init__
+
+    def schedule(self, deadline, callback):
+        """Call callback at deadline (on the time.monotonic() clock), instead
+        of when it was scheduled for before."""
+        self.cancel(callback)
+        entry = [deadline, next(self.counter), callback]
+        self.entries[callback] = entry
+        heapq.heappush(self.heap, entry)
+        self._arm()
+    #end schedule
+
+    def cancel(self, callback):
+        """Forget about the deadline of callback, if any."""
+        entry = self.entries.pop(callback, None)
+        if entry is not None:
+            entry[2] = None
+              # removed from the heap when it gets to the top
+        #end if
+    #end cancel
+
+    def _arm(self):
+        # (re)arms the GLib timeout for the earliest deadline.
+        while self.heap and self.heap[0][2] is None:
+            heapq.heappop(self.heap)
+        #end while
+        deadline = self.heap[0][0] if self.heap else None
+        if deadline == self.armed_for:
+            return
+        if self.source is not None:
+            GLib.source_remove(self.source)
+            self.source = None
+        #end if
+        self.armed_for = deadline
+        if deadline is not None:
+            delay = max(math.ceil((deadline - time.monotonic()) * 1000), 0)
+            self.source = GLib.timeout_add(delay, self._on_timeout)
+        #end if
+    #end _arm
+
+    def _on_timeout(self):
+        self.source = None
+        self.armed_for = None
+        now = time.monotonic()
+        while self.heap and self.heap[0][0] <= now:
+            _, _, callback = heapq.heappop(self.heap)
+            if callback is not None:
+                del self.entries[callback]
+                callback()
+            #end if
+        #end while
+        self._arm()
+        return False
+    #end _on_timeout
+
+#end TimerQueue
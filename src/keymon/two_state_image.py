@@ -18,6 +18,9 @@
 
 You can switch the image to something else but it defaults back to the default
 image (the first image) after calling EmptyEvent() a few times
+
+TwoState holds the logic, TwoStateImage shows it as a Gtk.Image.  See
+key_canvas.py for slots that are painted by a single widget instead.
 """
 
 __author__ = 'scott@forusers.com (Scott Kirkwood))'
@@ -30,24 +33,32 @@ from gi.repository import \
 
 DEFAULT_TIMEOUT_SECS = 0.5
 
-class TwoStateImage(Gtk.Image):
-    """Image has a default image (say a blank image) which it goes back to.
-    It can also pass the information down to another image."""
+class TwoState:
+    """Has a default image (say a blank image) which it goes back to.
 
-    def __init__(self, pixbufs, normal, is_modifier, show = True, defer_to = None):
-        Gtk.Image.__init__(self)
+    Subclasses show the images by implementing set_image, show and hide.
+
+    Given a timer_queue.TimerQueue, the image goes back to normal when its
+    time is up, otherwise empty_event() has to be called regularly."""
+
+    def __init__(self, pixbufs, normal, is_modifier, show = True, timers = None):
+        self.timers = timers
         self.pixbufs = pixbufs
         self.normal = normal
         self.is_modifier = is_modifier
         self.count_down = None
         self.showit = show
         self.current = ''
-        self.defer_to = defer_to
         self.timeout_secs = DEFAULT_TIMEOUT_SECS
         self.switch_to(self.normal)
         self.button_is_down = False
     #end __init__
 
+    def redraw(self):
+        """Fetch the current image again, the images have been re-rendered."""
+        self.set_image(self.pixbufs.get(self.current))
+    #end redraw
+
     def reset_image(self, showit=True):
         """Image from pixbufs has changed, reset."""
         self.showit = showit
@@ -55,6 +66,24 @@ class TwoStateImage(Gtk.Image):
         self.showit = True
     #end reset_image
 
+    @property
+    def count_down(self):
+        "when the countdown for returning to the default image started, on the monotonic clock."
+        return self._count_down
+    #end count_down
+
+    @count_down.setter
+    def count_down(self, count_down):
+        self._count_down = count_down
+        if self.timers is not None:
+            if count_down is None:
+                self.timers.cancel(self.empty_event)
+            else:
+                self.timers.schedule(count_down + self.timeout_secs, self.empty_event)
+            #end if
+        #end if
+    #end count_down
+
     @property
     def showing_button_down(self):
         "is the button currently showing the pressed state."
@@ -64,29 +93,18 @@ class TwoStateImage(Gtk.Image):
     def reset_time_if_pressed(self):
         """Start the countdown now."""
         if self.showing_button_down :
-            self.count_down = time.time()
+            self.count_down = time.monotonic()
         #end if
     #end reset_time_if_pressed
 
     def switch_to(self, name):
         """Switch to image with this name."""
-        if self.current != self.normal and self.defer_to != None :
-            # pass my current image settings onto defer_to button.
-            self._defer_to(self.current)
-            # Make sure defer_to image will only start counting timeout after self
-            # image has timed out.
-            if self.count_down != None :
-                self.defer_to.count_down = self.count_down + self.timeout_secs
-            else :
-                self.defer_to.count_down += self.timeout_secs
-            #end if
-        #end if
         self._switch_to(name)
     #end switch_to
 
     def _switch_to(self, name):
         # Internal, switch to image with this name even if same.
-        self.set_from_pixbuf(self.pixbufs.get(name))
+        self.set_image(self.pixbufs.get(name))
         self.current = name
         self.count_down = None # stay with this image until further notice
         if self.showit :
@@ -96,18 +114,22 @@ class TwoStateImage(Gtk.Image):
 
     def switch_to_default(self):
         "starts countdown for returning to the default image."
-        self.count_down = time.time()
+        self.count_down = time.monotonic()
     #end switch_to_default
 
     def empty_event(self):
-        """Sort of a idle event.
+        """Sort of a idle event, or the timer of the countdown.
 
         Returns True iff image has been changed back to normal.
         """
         changed = False
-        if not (self.is_modifier and self.button_is_down) and self.count_down != None :
-            delta = time.time() - self.count_down
-            if delta > self.timeout_secs :
+        if self.count_down != None :
+            if self.is_modifier and self.button_is_down :
+                if self.timers is not None:
+                    # check again later, the modifier may be released by then.
+                    self.timers.schedule(time.monotonic() + self.timeout_secs, self.empty_event)
+                #end if
+            elif time.monotonic() - self.count_down >= self.timeout_secs :
                 self.count_down = None
                 self._switch_to(self.normal)
                 changed = True
@@ -116,12 +138,18 @@ class TwoStateImage(Gtk.Image):
         return changed
     #end empty_event
 
-    def _defer_to(self, old_name):
-        """If possible the button is passed on."""
-        if self.defer_to != None :
-            self.defer_to.switch_to(old_name)
-            self.defer_to.switch_to_default()
-        #end if
-    #end _defer_to
+#end TwoState
+
+class TwoStateImage(TwoState, Gtk.Image):
+    """TwoState shown as an image widget of its own."""
+
+    def __init__(self, pixbufs, normal, is_modifier, show = True, timers = None):
+        Gtk.Image.__init__(self)
+        TwoState.__init__(self, pixbufs, normal, is_modifier, show, timers)
+    #end __init__
+
+    def set_image(self, img):
+        self.set_from_surface(img)
+    #end set_image
 
 #end TwoStateImage
@@ -33,14 +33,23 @@ import time
 import threading
 import collections
 
+from keymon import mod_mapper
+
+GROUP_SHIFT = 13
+  # XKB puts the group of a key event in bits 13 and 14 of its state
+GROUP_COLUMNS = tuple(columns[0] for columns in mod_mapper.GROUP_LEVEL_COLUMNS)
+  # column of the first level of groups 1 and 2 in the core keyboard
+  # mapping, where the others come after the extra levels of group 1.
+
 class XEvent:
     """An event, mimics edev.py events."""
 
-    def __init__(self, type, scancode, code, value):
+    def __init__(self, type, scancode, code, value, group=0):
         self._type = type
         self._scancode = scancode
         self._code = code
         self._value = value
+        self._group = group
     #end __init__
 
     @property
@@ -67,12 +76,18 @@ class XEvent:
         return self._value
     #end value
 
+    @property
+    def group(self):
+        "the XKB group (keyboard layout) active for a key event, from 0."
+        return self._group
+    #end group
+
     def __repr__(self):
         return \
           (
-                'XEvent(type:%s scancode:%s code:%s value:%s)'
+                'XEvent(type:%s scancode:%s code:%s value:%s group:%s)'
             %
-                (self._type, self._scancode, self._code, self._value)
+                (self._type, self._scancode, self._code, self._value, self._group)
           )
     #end __repr__
 
@@ -87,7 +102,9 @@ class XEvents(threading.Thread):
             4: 'REL_WHEEL', 5: 'REL_WHEEL', 6: 'REL_LEFT', 7: 'REL_RIGHT',
         }
 
-    def __init__(self):
+    def __init__(self, notify=None):
+        """notify, if given, is called from this thread whenever events have
+        been queued."""
 
         def setup_lookup():
             # sets up the key lookups.
@@ -138,7 +155,8 @@ class XEvents(threading.Thread):
         self.ctx = None
         self.keycode_to_symbol = collections.defaultdict(lambda: 'KEY_DUNNO')
         setup_lookup()
-        self.events = []  # each of type XEvent
+        self.events = collections.deque()  # each of type XEvent
+        self.notify = notify
     #end __init__
 
     def run(self):
@@ -149,7 +167,7 @@ class XEvents(threading.Thread):
     def next_event(self):
         """Returns the next event in queue, or None if none."""
         try :
-            return self.events.pop(0)
+            return self.events.popleft()
         except IndexError :
             return None
         #end try
@@ -254,13 +272,21 @@ class XEvents(threading.Thread):
               event: the event info
               value: 1=down, 0=up
             """
-            keysym = self.local_display.keycode_to_keysym(event.detail, 0)
-            if keysym not in self.keycode_to_symbol:
-                print('Missing code for %d = %d' % (event.detail - 8, keysym))
+            group = event.state >> GROUP_SHIFT & 3
+            keysym = X.NoSymbol
+            if group < len(GROUP_COLUMNS):
+                keysym = self.local_display.keycode_to_keysym(event.detail, GROUP_COLUMNS[group])
+            #end if
+            if keysym == X.NoSymbol:
+                keysym = self.local_display.keycode_to_keysym(event.detail, 0)
+            #end if
+            if keysym not in self.keycode_to_symbol and keysym != X.NoSymbol:
+                # named as in the keyboard map read from the server
+                self.keycode_to_symbol[keysym] = mod_mapper.keysym_key(keysym)
             #end if
             self.events.append \
               (
-                XEvent('EV_KEY', event.detail - 8, self.keycode_to_symbol[keysym], value)
+                XEvent('EV_KEY', event.detail - 8, self.keycode_to_symbol[keysym], value, group)
               )
         #end handle_key
 
@@ -292,6 +318,9 @@ class XEvents(threading.Thread):
                 print(event)
             #end if
         #end while
+        if self.notify and self.events:
+            self.notify()
+        #end if
     #end _handler
 
 #end XEvents